@@ -23,21 +23,22 @@ def main():
     
     start_time = time.time()
     
-    update_repo()
+    commit = update_repo()
     print("tinygrad repo: updated.")
-    bounties()
-    print("bounties: updated.")
-    scrape_tutorials()
-    print("tutorials: scraped.")
+    changed = bounties()
+    print(f"bounties: {'updated' if changed else 'unchanged'}.")
+    scraped = scrape_tutorials()
+    print(f"tutorials: {len(scraped)} changed.")
     
     print("\nIndexing data (this may take a while)...")
     indexer = Indexer("tinygrad_data")
-    indexer.index_repo()
-    indexer.index_bounties()
-    indexer.index_tutorials()
+    stats = indexer.index_all(commit=commit)
+    indexer.close()
     
     end_time = time.time()
     print(f"data: indexed and embedded in {end_time - start_time:.2f} seconds!")
+    print(f"embedding: {stats['docs']} docs in {stats['seconds']:.2f}s ({stats['docs_per_sec']:.1f} docs/sec)")
+    print(f"index: {stats['unchanged']} unchanged, {stats['deleted']} deleted")
     
     print("\nInitializing RAG system...")
     chatbot = ChatbotInterface()
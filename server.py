@@ -0,0 +1,51 @@
+from src.rag.retriever import Retriever
+from src.rag.generator import Generator
+import argparse
+import os
+import sys
+
+def check_openai_api_key():
+    if not os.getenv("OPENAI_API_KEY"):
+        return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve tinypilot over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--llm", choices=["openai", "fake"], default="openai", help="'fake' answers with a local stub model, no API key needed")
+    parser.add_argument("--max-concurrent-llm", type=int, default=4, help="LLM calls allowed in flight at once")
+    parser.add_argument("--max-pending", type=int, default=64, help="requests accepted before answering 503")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--workers", type=int, default=8, help="threads for encoding and chroma queries")
+    parser.add_argument("--query-backend", default="fp32", choices=["fp32", "int8", "onnx"], help="query encoder; check int8/onnx with benchmark.py --query-backend first")
+    args = parser.parse_args()
+
+    if args.llm == "openai" and not check_openai_api_key():
+        print("Error: OPENAI_API_KEY environment variable is not set.")
+        print("Please set it with:")
+        print("export OPENAI_API_KEY='your-api-key'")
+        sys.exit(1)
+
+    from aiohttp import web
+    from src.api.app import TinypilotService, create_app
+
+    try:
+        retriever = Retriever(backend=args.query_backend)
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        print("\nIf you haven't run the full initialization yet, please run:")
+        print("python main.py")
+        sys.exit(1)
+
+    if args.llm == "fake":
+        from src.rag.fake_llm import FakeChatModel
+        generator = Generator(llm=FakeChatModel())
+    else:
+        generator = Generator(model_name="gpt-4o-mini-2024-07-18")
+
+    service = TinypilotService(retriever, generator, max_concurrent_llm=args.max_concurrent_llm, max_pending=args.max_pending, timeout=args.timeout, workers=args.workers)
+    web.run_app(create_app(service), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+from src.indexing.snapshot import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+from src.rag.batcher import EmbeddingBatcher
+from src.rag.retriever import sources
+
+# top_k sizes the vector searches and the prompt; beyond this a single request can stall the shared retriever
+MAX_TOP_K = 50
+
+
+class Overloaded(Exception):
+    pass
+
+
+class TinypilotService:
+    # one retriever (embedding model + chroma client) and one generator shared by every request;
+    # query encodes are micro-batched, LLM calls are capped, requests beyond max_pending are refused
+    def __init__(self, retriever, generator, max_concurrent_llm: int = 4, max_pending: int = 64, timeout: float = 60.0, workers: int = 8, max_batch: int = 32, max_wait: float = 0.005):
+        self.retriever = retriever
+        self.generator = generator
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tinypilot")
+        self.batcher = EmbeddingBatcher(retriever.embed_many, max_batch=max_batch, max_wait=max_wait, executor=self.executor)
+        self.max_concurrent_llm = max_concurrent_llm
+        self.llm_slots = None
+        self.max_pending = max_pending
+        self.pending = 0
+        self.timeout = timeout
+
+    async def start(self, app=None):
+        self.llm_slots = asyncio.Semaphore(self.max_concurrent_llm)
+        self.batcher.start()
+
+    async def stop(self, app=None):
+        await self.batcher.stop()
+        self.executor.shutdown(wait=False)
+
+    def admit(self):
+        if self.pending >= self.max_pending: raise Overloaded()
+        self.pending += 1
+
+    def release(self):
+        self.pending -= 1
+
+    async def retrieve(self, query: str, top_k: int = 5):
+        loop = asyncio.get_running_loop()
+        needs_embedding = await loop.run_in_executor(self.executor, self.retriever.needs_embedding, query, top_k)
+        embedding = await self.batcher.embed(query) if needs_embedding else None
+        return await loop.run_in_executor(self.executor, self.retriever.retrieve, query, top_k, embedding)
+
+    async def prepare(self, query: str, docs):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.generator.prepare, query, docs)
+
+    async def answer(self, query: str, top_k: int = 5):
+        timings, start = {}, time.perf_counter()
+        docs = await self.retrieve(query, top_k)
+        timings["retrieve"] = time.perf_counter() - start
+        prompt, usage = await self.prepare(query, docs)
+        async with self.llm_slots:
+            start = time.perf_counter()
+            response = await self.generator.llm.ainvoke(prompt)
+            timings["llm"] = time.perf_counter() - start
+        return {"answer": response.content, "sources": sources(docs), "usage": usage, "timings": timings}
+
+
+async def _read_query(request):
+    try: body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError): raise web.HTTPBadRequest(text="body must be JSON")
+    query = str(body.get("query", "")).strip() if isinstance(body, dict) else ""
+    if not query: raise web.HTTPBadRequest(text="missing 'query'")
+    try: top_k = int(body.get("top_k", 5))
+    except (TypeError, ValueError): raise web.HTTPBadRequest(text="'top_k' must be an integer")
+    if not 1 <= top_k <= MAX_TOP_K: raise web.HTTPBadRequest(text=f"'top_k' must be between 1 and {MAX_TOP_K}")
+    return query, top_k
+
+
+def create_app(service: TinypilotService) -> web.Application:
+    @web.middleware
+    async def limits(request, handler):
+        if request.path == "/health": return await handler(request)
+        try: service.admit()
+        except Overloaded: return web.json_response({"error": "server busy"}, status=503, headers={"Retry-After": "1"})
+        try:
+            if request.path == "/answer/stream": return await handler(request)
+            async with asyncio.timeout(service.timeout): return await handler(request)
+        except TimeoutError:
+            return web.json_response({"error": f"request exceeded {service.timeout}s"}, status=504)
+        finally:
+            service.release()
+
+    async def health(request):
+        return web.json_response({"status": "ok", "pending": service.pending, "batcher": service.batcher.stats(), "cache": service.retriever.cache_stats()})
+
+    async def retrieve(request):
+        query, top_k = await _read_query(request)
+        start = time.perf_counter()
+        docs = await service.retrieve(query, top_k)
+        return web.json_response({"docs": docs, "timings": {"retrieve": time.perf_counter() - start}})
+
+    async def answer(request):
+        query, top_k = await _read_query(request)
+        return web.json_response(await service.answer(query, top_k))
+
+    async def answer_stream(request):
+        # server-sent events: one "token" event per chunk, then a "done" event with sources and usage
+        # the timeout is handled here because once streaming has started the status can no longer become a 504
+        query, top_k = await _read_query(request)
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        try:
+            async with asyncio.timeout(service.timeout):
+                docs = await service.retrieve(query, top_k)
+                prompt, usage = await service.prepare(query, docs)
+                async with service.llm_slots:
+                    await response.prepare(request)
+                    async for chunk in service.generator.llm.astream(prompt):
+                        if chunk.content: await response.write(f"event: token\ndata: {json.dumps(chunk.content)}\n\n".encode())
+                await response.write(f"event: done\ndata: {json.dumps({'sources': sources(docs), 'usage': usage})}\n\n".encode())
+        except TimeoutError:
+            if not response.prepared: return web.json_response({"error": f"request exceeded {service.timeout}s"}, status=504)
+            await response.write(f"event: error\ndata: {json.dumps(f'request exceeded {service.timeout}s')}\n\n".encode())
+        await response.write_eof()
+        return response
+
+    app = web.Application(middlewares=[limits])
+    app.on_startup.append(service.start)
+    app.on_cleanup.append(service.stop)
+    app.router.add_get("/health", health)
+    app.router.add_post("/retrieve", retrieve)
+    app.router.add_post("/answer", answer)
+    app.router.add_post("/answer/stream", answer_stream)
+    return app
@@ -0,0 +1,132 @@
+import os
+import sys
+import json
+import time
+import asyncio
+from typing import Any, Dict, Iterable, List, Set
+from src.rag.retriever import sources
+from src.rag.tracing import start_trace
+
+
+class RateLimiter:
+    # spaces calls at least 1/rate seconds apart; rate <= 0 disables it
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval: return
+        async with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0: await asyncio.sleep(wait)
+
+
+def read_questions(lines: Iterable[str]) -> List[str]:
+    # one question per line; blank lines and '#' comments are skipped, {"question": ...} JSON lines are accepted too
+    questions = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"): continue
+        if line.startswith("{"):
+            try: line = str(json.loads(line)["question"]).strip()
+            except (ValueError, KeyError, TypeError): pass
+        questions.append(line)
+    return questions
+
+
+def completed(output_path: str) -> Set[tuple]:
+    # (index, question) pairs already answered in an earlier run; failed ones are retried
+    done = set()
+    if not os.path.exists(output_path): return done
+    with open(output_path, "r") as f:
+        for line in f:
+            try: record = json.loads(line)
+            except ValueError: continue  # a line cut short by an interruption
+            if "answer" in record: done.add((record["index"], record["question"]))
+    return done
+
+
+class BatchRunner:
+    # answers a list of questions without the terminal UI: one batched encode for every query embedding, then
+    # retrieval and generation per question on the event loop, with at most `concurrency` LLM calls in flight and
+    # at most `rate` LLM calls started per second. Each result is appended to a JSONL file as soon as it is ready
+    def __init__(self, retriever, generator, concurrency: int = 4, rate: float = 0.0, top_k: int = 5):
+        self.retriever = retriever
+        self.generator = generator
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate)
+        self.top_k = top_k
+
+    async def answer(self, index: int, question: str, embedding, slots: asyncio.Semaphore) -> Dict[str, Any]:
+        trace, start = start_trace(), time.perf_counter()
+        record: Dict[str, Any] = {"index": index, "question": question}
+        try:
+            docs = await asyncio.to_thread(self.retriever.retrieve, question, self.top_k, embedding)
+            retrieved = time.perf_counter()
+            async with slots:
+                await self.limiter.acquire()
+                queued = time.perf_counter()
+                answer = await self.generator.generate_async(question, docs)
+            record.update({"answer": answer, "sources": sources(docs)})
+            record["timings"] = {"retrieve": retrieved - start, "queue": queued - retrieved, **trace.durations, "total": time.perf_counter() - start}
+        except Exception as e:
+            record.update({"error": f"{type(e).__name__}: {e}", "timings": {**trace.durations, "total": time.perf_counter() - start}})
+        record["usage"] = {key: trace.counters[key] for key in ("docs_retrieved", "prompt_tokens", "completion_tokens") if key in trace.counters}
+        return record
+
+    async def run(self, questions: List[str], output_path: str) -> Dict[str, Any]:
+        start = time.perf_counter()
+        done = completed(output_path)
+        pending = [(i, q) for i, q in enumerate(questions) if (i, q) not in done]
+
+        # every embedding the retrievals will need, in one batched call (lexical-only and pure bounty queries need none)
+        needs = [q for _, q in pending if self.retriever.needs_embedding(q, self.top_k)]
+        embeddings = dict(zip(needs, await asyncio.to_thread(self.retriever.embed_many, needs))) if needs else {}
+        embedded = time.perf_counter()
+
+        slots = asyncio.Semaphore(self.concurrency)
+        answered = failed = 0
+        with open(output_path, "a") as out:
+            for task in asyncio.as_completed([self.answer(i, q, embeddings.get(q), slots) for i, q in pending]):
+                record = await task
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                if "answer" in record: answered += 1
+                else: failed += 1
+        elapsed = time.perf_counter() - start
+        return {"questions": len(questions), "skipped": len(questions) - len(pending), "answered": answered, "failed": failed,
+                "embed_seconds": embedded - start, "seconds": elapsed, "questions_per_sec": len(pending) / elapsed if elapsed > 0 else 0.0}
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Answer a list of questions non-interactively and write JSONL")
+    parser.add_argument("questions", nargs="?", default="-", help="file with one question per line, '-' for stdin")
+    parser.add_argument("-o", "--output", default="answers.jsonl", help="JSONL output; answered questions already in it are skipped")
+    parser.add_argument("--concurrency", type=int, default=4, help="LLM calls in flight at once")
+    parser.add_argument("--rate", type=float, default=0.0, help="max LLM calls started per second (0 = unlimited)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--llm", choices=["openai", "fake"], default="openai", help="'fake' answers with a local stub model, no API key needed")
+    args = parser.parse_args(argv)
+
+    if args.llm == "openai" and not os.getenv("OPENAI_API_KEY"):
+        print("Error: OPENAI_API_KEY environment variable is not set (or use --llm fake).", file=sys.stderr)
+        sys.exit(1)
+
+    from src.rag.retriever import Retriever
+    from src.rag.generator import Generator
+    if args.questions == "-": questions = read_questions(sys.stdin)
+    else:
+        with open(args.questions, "r") as f: questions = read_questions(f)
+    if args.llm == "fake":
+        from src.rag.fake_llm import FakeChatModel
+        generator = Generator(llm=FakeChatModel())
+    else:
+        generator = Generator(model_name="gpt-4o-mini-2024-07-18")
+
+    runner = BatchRunner(Retriever(), generator, concurrency=args.concurrency, rate=args.rate, top_k=args.top_k)
+    summary = asyncio.run(runner.run(questions, args.output))
+    print(json.dumps(summary), file=sys.stderr)
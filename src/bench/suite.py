@@ -0,0 +1,147 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import tempfile
+import subprocess
+from typing import Dict, Any
+from src.rag.tracing import percentiles
+
+_WORDS = ["uop", "buffer", "kernel", "shape", "view", "lazy", "schedule", "realize", "linearize", "render", "device", "dtype",
+          "reduce", "expand", "reshape", "permute", "pad", "shrink", "stride", "mask", "graph", "rewrite", "pattern", "beam",
+          "jit", "compile", "program", "allocator", "memory", "tensor", "grad", "optim", "symbolic", "variable", "node", "fuse"]
+
+
+def synthetic_repo(path: str, files: int = 200, seed: int = 0) -> str:
+    # deterministic tinygrad-flavoured python sources so code indexing can be measured without a checkout
+    rng = random.Random(seed)
+    for i in range(files):
+        package = os.path.join(path, "tinygrad", rng.choice(["", "codegen", "engine", "runtime", "shape", "nn"]))
+        os.makedirs(package, exist_ok=True)
+        lines = [f'"""{" ".join(rng.sample(_WORDS, 6))}"""', "from typing import Any", ""]
+        for c in range(rng.randint(1, 4)):
+            lines.append(f"class {rng.choice(_WORDS).capitalize()}{rng.choice(_WORDS).capitalize()}{c}:")
+            for m in range(rng.randint(1, 6)):
+                name = "_".join(rng.sample(_WORDS, 2))
+                lines.append(f"  def {name}(self, x:Any) -> Any:")
+                for _ in range(rng.randint(2, 20)):
+                    lines.append(f"    x = x.{rng.choice(_WORDS)}({rng.randint(0, 64)})  # {' '.join(rng.sample(_WORDS, 3))}")
+                lines.append("    return x")
+            lines.append("")
+        for f in range(rng.randint(0, 5)):
+            lines.append(f"def {'_'.join(rng.sample(_WORDS, 3))}_{f}(a, b): return a.{rng.choice(_WORDS)}(b)")
+        with open(os.path.join(package, f"{rng.choice(_WORDS)}_{i}.py"), "w") as out: out.write("\n".join(lines) + "\n")
+    return os.path.join(path, "tinygrad")
+
+
+def _matches(doc: Dict[str, Any], label: Dict[str, str]) -> bool:
+    if doc["metadata"].get("type") != label["type"]: return False
+    if label["type"] == "tutorial": return doc["metadata"].get("source") == label["answer"]
+    return label["answer"].lower() in doc["content"].lower()
+
+
+def _git_commit() -> str:
+    try: return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError): return "unknown"
+
+
+def run_benchmark(questions_path: str = "data/benchmark/questions.json", bounty_path: str = "data/bounties.csv", scraped_path: str = "data/tutorials",
+                  code_files: int = 200, repeats: int = 5, ks=(1, 3, 5, 10), model_name: str = "all-MiniLM-L6-v2", workdir: str = None,
+                  index_backend: str = "multiprocess", query_backend: str = "fp32", tolerance: float = 0.9, store: str = "chroma") -> Dict[str, Any]:
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    from src.indexing.indexer import Indexer
+    from src.rag.retriever import Retriever
+    from src.rag.generator import Generator
+    from src.rag.fake_llm import FakeChatModel
+    from src.embedding.backend import verify_backend
+
+    with open(questions_path, "r") as f: labels = json.load(f)
+    root = workdir or tempfile.mkdtemp(prefix="tinypilot-bench-")
+    try:
+        persist_directory = os.path.join(root, "chroma_db")
+        repo_path = synthetic_repo(os.path.join(root, "repo"), files=code_files)
+
+        indexer = Indexer("bench_data", model_name=model_name, persist_directory=persist_directory, backend=index_backend, store=store)
+        indexer.backend.encode(["warm up"])
+        indexing = indexer.index_all(repo_path=repo_path, bounty_path=bounty_path, scraped_path=scraped_path, commit="bench")
+        start = time.perf_counter()
+        reindex = indexer.index_all(repo_path=repo_path, bounty_path=bounty_path, scraped_path=scraped_path, commit="bench")
+        reindex["seconds"] = time.perf_counter() - start
+        indexer.close()
+
+        retriever = Retriever("bench_data", persist_directory=persist_directory, model_name=model_name, backend=query_backend)
+        # a non-fp32 query encoder is only acceptable if it ranks the index like fp32 does
+        verification = verify_backend(retriever.backend, retriever.store, [label["question"] for label in labels], tolerance=tolerance) if query_backend != "fp32" else None
+        generator = Generator(llm=FakeChatModel(first_token_delay=0.0, token_delay=0.0))
+        retriever.retrieve("warm up")
+
+        cold, warm, prompt_tokens, context_tokens, prepare = [], [], [], [], []
+        hits = {k: 0 for k in ks}
+        for label in labels:
+            for _ in range(repeats):
+                retriever.results_cache.clear()
+                retriever.embedding_cache.clear()
+                start = time.perf_counter()
+                docs = retriever.retrieve(label["question"])
+                cold.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            retriever.retrieve(label["question"])
+            warm.append(time.perf_counter() - start)
+
+            for k in ks:
+                if any(_matches(doc, label) for doc in docs[:k]): hits[k] += 1
+            start = time.perf_counter()
+            _, usage = generator.prepare(label["question"], docs)
+            prepare.append(time.perf_counter() - start)
+            prompt_tokens.append(usage["prompt_tokens"])
+            context_tokens.append(usage["context_tokens"])
+
+        by_type = {}
+        for label in labels: by_type.setdefault(label["type"], []).append(label)
+
+        return {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "model": model_name,
+            "config": {"questions": len(labels), "code_files": code_files, "repeats": repeats, "batch_size": indexer.batch_size,
+                       "index_backend": index_backend, "query_backend": query_backend, "store": store},
+            "indexing": {"docs": indexing["docs"], "seconds": indexing["seconds"], "docs_per_sec": indexing["docs_per_sec"],
+                         "noop_reindex_seconds": reindex["seconds"]},
+            "retrieve_seconds": {"cold": percentiles(cold), "cached": percentiles(warm)},
+            "prompt_tokens": percentiles(prompt_tokens),
+            "context_tokens": percentiles(context_tokens),
+            "prepare_seconds": percentiles(prepare),
+            "recall": {f"@{k}": hits[k] / len(labels) for k in ks},
+            "questions_by_type": {t: len(v) for t, v in by_type.items()},
+            "backend_verification": verification,
+        }
+    finally:
+        if workdir is None: shutil.rmtree(root, ignore_errors=True)
+
+
+def main(argv=None):
+    import argparse
+    from src.embedding.backend import BACKENDS
+    from src.store.vector_store import STORES
+    parser = argparse.ArgumentParser(description="Offline benchmark for indexing throughput, retrieval latency and recall")
+    parser.add_argument("--questions", default="data/benchmark/questions.json")
+    parser.add_argument("--code-files", type=int, default=200, help="size of the synthetic code corpus")
+    parser.add_argument("--repeats", type=int, default=5, help="cold retrievals per question")
+    parser.add_argument("--index-backend", default="multiprocess", choices=BACKENDS, help="embedding backend used to build the index")
+    parser.add_argument("--query-backend", default="fp32", choices=BACKENDS, help="query encoder; anything but fp32 is also checked against fp32 rankings")
+    parser.add_argument("--store", default="chroma", choices=STORES, help="vector store to build and query")
+    parser.add_argument("--tolerance", type=float, default=0.9, help="minimum mean top-10 overlap with the fp32 rankings")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.questions, code_files=args.code_files, repeats=args.repeats, index_backend=args.index_backend, query_backend=args.query_backend, tolerance=args.tolerance, store=args.store)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f: f.write(text + "\n")
+    sys.stdout.write(text + "\n")
+    if results["backend_verification"] and not results["backend_verification"]["passed"]: sys.exit(1)
@@ -0,0 +1,118 @@
+import os
+import copy
+import threading
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from src.embedding.registry import get_model
+
+BACKENDS = ("fp32", "multiprocess", "int8", "onnx")
+
+
+class EmbeddingBackend:
+    # one sentence-transformers model behind encode(); every backend of a model produces vectors in the
+    # same space, so documents indexed with one can be queried with another
+    name = "fp32"
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        return get_model(self.model_name)
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None: self._model = self.load()
+            return self._model
+
+    def bulk_size(self, batch_size: int) -> int:
+        # how many texts the indexer should hand over per encode call
+        return batch_size
+
+    def encode(self, texts: Sequence[str], batch_size: int = 32) -> np.ndarray:
+        return self.model.encode(list(texts), batch_size=batch_size, show_progress_bar=False, convert_to_numpy=True)
+
+    def encode_query(self, text: str) -> List[float]:
+        return self.model.encode(text, show_progress_bar=False).tolist()
+
+    def close(self):
+        pass
+
+
+class MultiProcessBackend(EmbeddingBackend):
+    # bulk indexing on every core: one worker process per core, each holding its own copy of the model.
+    # The pool starts on the first encode large enough to be worth splitting
+    name = "multiprocess"
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", processes: Optional[int] = None):
+        super().__init__(model_name)
+        self.processes = processes or os.cpu_count() or 1
+        self.pool = None
+
+    def bulk_size(self, batch_size: int) -> int:
+        return batch_size * self.processes * 4
+
+    def encode(self, texts: Sequence[str], batch_size: int = 32) -> np.ndarray:
+        if self.processes < 2 or len(texts) < batch_size * 2: return super().encode(texts, batch_size)
+        if self.pool is None: self.pool = self.model.start_multi_process_pool(["cpu"] * self.processes)
+        chunk_size = max(batch_size, -(-len(texts) // self.processes))
+        return self.model.encode(list(texts), batch_size=batch_size, show_progress_bar=False, pool=self.pool, chunk_size=chunk_size)
+
+    def close(self):
+        if self.pool is not None:
+            self.model.stop_multi_process_pool(self.pool)
+            self.pool = None
+
+
+class QuantizedBackend(EmbeddingBackend):
+    # dynamic int8 quantization of the transformer's Linear layers: weights stored as int8, activations
+    # quantized on the fly. Lower single-query latency on CPU at a small cost in precision
+    name = "int8"
+
+    def load(self):
+        import torch
+        model = copy.deepcopy(get_model(self.model_name)).to("cpu")
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+class OnnxBackend(EmbeddingBackend):
+    # the same model exported to ONNX and run by onnxruntime; needs `pip install sentence-transformers[onnx]`
+    name = "onnx"
+
+    def load(self):
+        from sentence_transformers import SentenceTransformer
+        try: return SentenceTransformer(self.model_name, backend="onnx", device="cpu")
+        except ImportError as e: raise ImportError("the onnx embedding backend needs `pip install sentence-transformers[onnx]`") from e
+
+
+_backends: Dict[tuple, EmbeddingBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name: str = "fp32", model_name: str = "all-MiniLM-L6-v2", processes: Optional[int] = None) -> EmbeddingBackend:
+    # shared per (backend, model) like get_model, so the indexer, retriever and API server reuse one instance
+    if isinstance(name, EmbeddingBackend): return name
+    if name not in BACKENDS: raise ValueError(f"unknown embedding backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    with _backends_lock:
+        key = (name, model_name, processes)
+        if key not in _backends:
+            if name == "multiprocess": _backends[key] = MultiProcessBackend(model_name, processes)
+            else: _backends[key] = {"fp32": EmbeddingBackend, "int8": QuantizedBackend, "onnx": OnnxBackend}[name](model_name)
+        return _backends[key]
+
+
+def verify_backend(candidate: EmbeddingBackend, store, queries: Sequence[str], baseline: Optional[EmbeddingBackend] = None, k: int = 10, tolerance: float = 0.9) -> Dict:
+    # rankings from the candidate query encoder must match the fp32 ones against the real index:
+    # mean overlap@k at least `tolerance`, reported per query so outliers are visible
+    baseline = baseline or get_backend("fp32", candidate.model_name)
+    overlaps, worst = [], []
+    for query in queries:
+        ids = [[hit["id"] for hit in store.query(backend.encode_query(query), k)] for backend in (baseline, candidate)]
+        overlap = len(set(ids[0]) & set(ids[1])) / max(len(ids[0]), 1)
+        overlaps.append(overlap)
+        if overlap < tolerance: worst.append({"query": query, "overlap": overlap})
+    mean = sum(overlaps) / len(overlaps) if overlaps else 1.0
+    return {"backend": candidate.name, "baseline": baseline.name, "k": k, "tolerance": tolerance, "queries": len(overlaps),
+            "mean_overlap": mean, "min_overlap": min(overlaps, default=1.0), "below_tolerance": worst, "passed": mean >= tolerance}
@@ -0,0 +1,15 @@
+import threading
+from typing import Dict
+
+_models: Dict[str, object] = {}
+_lock = threading.Lock()
+
+
+def get_model(model_name: str = "all-MiniLM-L6-v2"):
+    # one SentenceTransformer per model name per process; concurrent callers wait for the first load
+    with _lock:
+        if model_name not in _models:
+            from sentence_transformers import SentenceTransformer
+            _models[model_name] = SentenceTransformer(model_name)
+        return _models[model_name]
+
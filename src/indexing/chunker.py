@@ -0,0 +1,71 @@
+import ast
+from typing import List, Dict, Any
+
+Chunk = Dict[str, Any]
+
+
+def _chunk(lines: List[str], start: int, end: int, symbol: str) -> Chunk:
+    return {"text": "".join(lines[start - 1:end]), "start_line": start, "end_line": end, "symbol": symbol}
+
+
+def _split_lines(lines: List[str], start: int, end: int, symbol: str, max_chars: int) -> List[Chunk]:
+    # last resort for oversized bodies: cut at line boundaries
+    chunks, chunk_start, size = [], start, 0
+    for lineno in range(start, end + 1):
+        size += len(lines[lineno - 1])
+        if size > max_chars and lineno > chunk_start:
+            chunks.append(_chunk(lines, chunk_start, lineno - 1, symbol))
+            chunk_start, size = lineno, len(lines[lineno - 1])
+    chunks.append(_chunk(lines, chunk_start, end, symbol))
+    return chunks
+
+
+def _node_start(node: ast.stmt) -> int:
+    return min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+
+
+def _split_body(lines: List[str], body: List[ast.stmt], start: int, end: int, prefix: str, max_chars: int) -> List[Chunk]:
+    # one chunk per def/class, runs of other statements grouped; trailing comments and blank lines stay with the preceding node
+    chunks, run_start = [], start
+    for i, node in enumerate(body):
+        node_start = max(_node_start(node), start)
+        node_end = _node_start(body[i + 1]) - 1 if i + 1 < len(body) else end
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if run_start < node_start: chunks.extend(_split_lines(lines, run_start, node_start - 1, prefix or "<module>", max_chars))
+            symbol = f"{prefix}.{node.name}" if prefix else node.name
+            chunks.extend(_split_node(lines, node, node_start, node_end, symbol, max_chars))
+            run_start = node_end + 1
+    if run_start <= end: chunks.extend(_split_lines(lines, run_start, end, prefix or "<module>", max_chars))
+    return chunks
+
+
+def _split_node(lines: List[str], node: ast.stmt, start: int, end: int, symbol: str, max_chars: int) -> List[Chunk]:
+    if sum(len(line) for line in lines[start - 1:end]) <= max_chars: return [_chunk(lines, start, end, symbol)]
+    if isinstance(node, ast.ClassDef):
+        defs = [n for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))]
+        if defs:
+            header_end = _node_start(defs[0]) - 1
+            header = _split_lines(lines, start, header_end, symbol, max_chars) if header_end >= start else []
+            return header + _split_body(lines, node.body[node.body.index(defs[0]):], header_end + 1, end, symbol, max_chars)
+    return _split_lines(lines, start, end, symbol, max_chars)
+
+
+def _merge(chunks: List[Chunk], lines: List[str], max_chars: int) -> List[Chunk]:
+    # pack runs of small neighbouring chunks together so tiny helpers don't each become a vector
+    merged: List[Chunk] = []
+    for chunk in chunks:
+        if merged and len(merged[-1]["text"]) + len(chunk["text"]) <= max_chars:
+            prev = merged[-1]
+            symbol = prev["symbol"] if prev["symbol"] == chunk["symbol"] else f"{prev['symbol']}, {chunk['symbol']}"
+            merged[-1] = _chunk(lines, prev["start_line"], chunk["end_line"], symbol)
+        else: merged.append(chunk)
+    return merged
+
+
+def chunk_python(source: str, max_chars: int = 1000) -> List[Chunk]:
+    lines = source.splitlines(keepends=True)
+    if not lines: return []
+    try: tree = ast.parse(source)
+    except (SyntaxError, ValueError): return _split_lines(lines, 1, len(lines), "<module>", max_chars)
+    chunks = _split_body(lines, tree.body, 1, len(lines), "", max_chars)
+    return [c for c in _merge(chunks, lines, max_chars) if c["text"].strip()]
@@ -1,56 +1,255 @@
 import os
-import pandas as pd
-import chromadb
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any
+import time
+import queue
+import threading
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple, Union
+from src.indexing.manifest import Manifest, content_hash, file_hash
+from src.indexing.chunker import chunk_python
+from src.indexing.lexical import LexicalIndex
+from src.embedding.backend import EmbeddingBackend, get_backend
+from src.store.vector_store import open_store, ChromaStore
+from src.store.partitioned import PARTITIONS
+from src.rag.bounty_query import parse_value
+
+Doc = Tuple[str, str, Dict[str, Any]]
+# bump whenever ids or metadata change shape so existing indexes are rebuilt
+INDEX_SCHEMA = 2
 
 
 class Indexer:
-    def __init__(self, collection_name: str, model_name: str = "all-MiniLM-L6-v2", persist_directory: str = "./chroma_db", batch_size: int = 32):
+    def __init__(self, collection_name: str, model_name: str = "all-MiniLM-L6-v2", persist_directory: str = "./chroma_db", batch_size: int = 32, write_queue_size: int = 4, chunk_chars: int = 1000,
+                 backend: Union[str, EmbeddingBackend] = "multiprocess", processes: Optional[int] = None, store: str = "chroma"):
         self.collection_name = collection_name
         self.model_name = model_name
-        self.model = SentenceTransformer(model_name)
-        self.client = chromadb.PersistentClient(path=persist_directory)
-        self.collection = self.client.get_or_create_collection(collection_name)
+        # bulk encodes go to a pool of processes (one per core by default); documents and queries share one vector space
+        self.backend = get_backend(backend, model_name, processes)
+        # "chroma" or "flat" (memory-mapped float16 matrix, exact search); recorded in the manifest for the retriever.
+        # Code, tutorials and bounties each get their own collection, see PartitionedStore
+        self.persist_directory = persist_directory
+        self.store = open_store(store, persist_directory, collection_name, create=True, partitioned=True)
         self.batch_size = batch_size
+        self.write_queue_size = write_queue_size
+        self.chunk_chars = chunk_chars
+        self.stats = {"docs": 0, "seconds": 0.0, "docs_per_sec": 0.0}
+        self.manifest = Manifest(os.path.join(persist_directory, "manifest.json"))
+        lexical_path = os.path.join(persist_directory, "lexical.pkl")
+        self.lexical = LexicalIndex.load(lexical_path) or LexicalIndex(lexical_path)
+        switched = self.manifest.data["docs"] and self.manifest.data.get("store", "chroma") != store
+        # written before per-source collections: everything sits in one collection named collection_name
+        mixed = self.manifest.data["docs"] and not self.manifest.data.get("partitioned")
+        if self.manifest.data["model"] != model_name or self.manifest.data["schema"] != INDEX_SCHEMA or switched:
+            if self.store.count():
+                self.store.reset()
+                self.store.flush()
+            if mixed: self.split_collection(copy=False)
+            self.move_partitions(copy=False)
+            self.manifest.reset(model_name, INDEX_SCHEMA)
+            self.lexical.clear()
+        elif mixed and self.split_collection():
+            # saved at once: the mixed collection is gone, so readers must find the new layout
+            self.manifest.data["partitioned"] = True
+            self.manifest.bump()
+            self.manifest.save()
+            self.rebuild_lexical()
+        elif self.manifest.data["docs"] and self.move_partitions():
+            # the same documents under the same ids, so the lexical index stands
+            self.manifest.bump()
+            self.manifest.save()
+        elif self.manifest.data["docs"] and self.store.count() == 0:
+            self.manifest.reset(model_name, INDEX_SCHEMA)
+            self.lexical.clear()
+        elif self.lexical.version != self.manifest.version and self.store.count():
+            self.rebuild_lexical()
+        self.manifest.data["store"] = store
+        self.manifest.data["partitioned"] = True
+
+    def close(self):
+        self.backend.close()
+
+    def split_collection(self, copy: bool = True) -> int:
+        # copy the vectors of a mixed collection into the per-source ones (no re-embedding), then drop it
+        try: mixed = open_store(self.manifest.data.get("store", "chroma"), self.persist_directory, self.collection_name)
+        except Exception: return 0  # already gone, nothing to copy
+        copied = 0
+        if copy:
+            ids, vectors, documents, metadatas = mixed.export()
+            self.store.reset()
+            for offset in range(0, len(ids), 4096):  # below chroma's maximum batch size
+                end = offset + 4096
+                self.store.upsert(ids[offset:end], vectors[offset:end], documents[offset:end], metadatas[offset:end])
+            self.store.flush()
+            copied = len(ids)
+        mixed.drop()
+        return copied
+
+    def move_partitions(self, copy: bool = True) -> int:
+        # partitions searched exactly (PARTITIONS[source] is None) that an earlier layout kept as chroma collections:
+        # copy their vectors into the flat ones (no re-embedding), then drop the chroma collections
+        if self.manifest.data.get("store", "chroma") != "chroma": return 0
+        copied = 0
+        for source, hnsw in PARTITIONS.items():
+            if hnsw is not None: continue
+            try: old = ChromaStore(self.persist_directory, f"{self.collection_name}_{source}")
+            except Exception: continue  # never written to chroma
+            if copy:
+                ids, vectors, documents, metadatas = old.export()
+                part = self.store.parts[source]
+                part.reset()
+                if ids: part.upsert(ids, vectors, documents, metadatas)
+                part.flush()
+                copied += len(ids)
+            old.drop()
+        return copied
+
+    def rebuild_lexical(self):
+        # indexes written before the lexical index existed (or by an interrupted run) get it rebuilt from the stored chunks, no re-embedding
+        self.lexical.clear()
+        for offset in range(0, self.store.count(), 1000):
+            self.lexical.add_many((doc["id"], doc["content"], doc["metadata"]) for doc in self.store.get(limit=1000, offset=offset))
+        self.lexical.save(self.manifest.version)
 
     def process_batch(self, texts: List[str], metadata: List[Dict[str, Any]], ids: List[str]) -> None:
         if not texts: return
-        
-        embeddings = self.model.encode(texts, show_progress_bar=False)
-        self.collection.add(ids=ids, embeddings=embeddings.tolist(), documents=texts, metadatas=metadata)
 
-    def batch_iterator(self, items: List[Any], batch_size: int):
-        for i in range(0, len(items), batch_size): yield items[i:i + batch_size]
+        embeddings = self.backend.encode(texts, batch_size=self.batch_size)
+        self.store.upsert(ids, embeddings.tolist(), texts, metadata)
+        self.store.flush()
+
+    def batch_iterator(self, items: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+        it = iter(items)
+        while batch := list(islice(it, batch_size)): yield batch
+
+    def _writer(self, writes: queue.Queue, errors: List[BaseException]):
+        while (item := writes.get()) is not None:
+            if errors: continue
+            ids, embeddings, texts, metadata = item
+            try: self.store.upsert(ids, embeddings, texts, metadata)
+            except BaseException as e: errors.append(e)
+
+    def index_docs(self, docs: Iterable[Doc]) -> Dict[str, float]:
+        # encode on this thread, write to chroma on a background thread; the bounded queue keeps memory flat
+        writes: queue.Queue = queue.Queue(maxsize=self.write_queue_size)
+        errors: List[BaseException] = []
+        writer = threading.Thread(target=self._writer, args=(writes, errors), daemon=True)
+        start, count = time.perf_counter(), 0
+        writer.start()
+        try:
+            for batch in self.batch_iterator(docs, self.backend.bulk_size(self.batch_size)):
+                if errors: break
+                ids, texts, metadata = (list(col) for col in zip(*batch))
+                embeddings = self.backend.encode(texts, batch_size=self.batch_size).tolist()
+                writes.put((ids, embeddings, texts, metadata))
+                count += len(batch)
+        finally:
+            writes.put(None)
+            writer.join()
+        if errors: raise errors[0]
+
+        elapsed = time.perf_counter() - start
+        stats = {"docs": count, "seconds": elapsed, "docs_per_sec": count / elapsed if elapsed > 0 else 0.0}
+        self.stats = {"docs": self.stats["docs"] + count, "seconds": self.stats["seconds"] + elapsed}
+        self.stats["docs_per_sec"] = self.stats["docs"] / self.stats["seconds"] if self.stats["seconds"] > 0 else 0.0
+        return stats
+
+    def split(self, doc_id: str, text: str, metadata: Dict[str, Any]) -> List[Doc]:
+        if metadata.get("type") != "code": return [(doc_id, text, metadata)]
+        path = metadata["source"]
+        return [(f"{doc_id}:{c['start_line']}-{c['end_line']}", f"# {path} ({c['symbol']}, lines {c['start_line']}-{c['end_line']})\n{c['text']}",
+                 {**metadata, "start_line": c["start_line"], "end_line": c["end_line"], "symbol": c["symbol"]})
+                for c in chunk_python(text, self.chunk_chars)]
 
-    def index_repo(self, repo_path: str = "data/tinygrad"):
+    def sync(self, source: str, docs: Iterable[Doc]) -> Dict[str, float]:
+        # embed and upsert only new or changed docs of one source type, delete the ones that disappeared;
+        # each source doc maps to the ids of the chunks it was split into
+        known, seen, stale, updated = self.manifest.docs(source), {}, [], []
+
+        def changed():
+            for doc_id, text, metadata in docs:
+                if doc_id in seen: continue
+                digest, old = content_hash(text), known.get(doc_id)
+                if isinstance(old, str): old = {"hash": old, "ids": [doc_id]}
+                if old and old["hash"] == digest:
+                    seen[doc_id] = old
+                    continue
+                chunks = self.split(doc_id, text, metadata)
+                seen[doc_id] = {"hash": digest, "ids": [chunk[0] for chunk in chunks]}
+                updated.append(doc_id)
+                if old: stale.extend(set(old["ids"]) - set(seen[doc_id]["ids"]))
+                self.lexical.add_many(chunks)
+                yield from chunks
+
+        stats = self.index_docs(changed())
+        removed = [doc_id for doc_id in known if doc_id not in seen]
+        stale.extend(chunk_id for doc_id in removed for chunk_id in (known[doc_id]["ids"] if isinstance(known[doc_id], dict) else [doc_id]))
+        for batch in self.batch_iterator(stale, self.batch_size * 32): self.store.delete(batch)
+        self.store.flush()
+        self.lexical.remove(stale)
+        if updated or stale:
+            self.manifest.data["docs"][source] = seen
+            self.manifest.bump()
+            self.lexical.save(self.manifest.version)
+        self.manifest.save()
+        return {**stats, "deleted": len(removed), "unchanged": len(seen) - len(updated)}
+
+    def _skipped(self, source: str) -> Dict[str, float]:
+        return {"docs": 0, "seconds": 0.0, "docs_per_sec": 0.0, "deleted": 0, "unchanged": len(self.manifest.docs(source))}
+
+    def repo_docs(self, repo_path: str = "data/tinygrad") -> Iterator[Doc]:
         for root, _, files in os.walk(repo_path):
-            for file in files:
+            for file in sorted(files):
                 if file.endswith(".py"):
-                    with open(os.path.join(root, file), "r") as f:
-                        content = f.read()
-                        embedding = self.model.encode(content).tolist()
-                        self.collection.add(ids=[f"repo_{file}"], embeddings=[embedding], documents=[content], metadatas=[{"source": file, "type": "code"}])
+                    path = os.path.join(root, file)
+                    relpath = os.path.relpath(path, repo_path).replace(os.sep, "/")
+                    with open(path, "r") as f:
+                        yield f"repo_{relpath}", f.read(), {"source": relpath, "type": "code"}
 
-    def index_bounties(self, bounty_path: str = "data/bounties.csv"):
+    def bounty_docs(self, bounty_path: str = "data/bounties.csv") -> Iterator[Doc]:
+        import pandas as pd
         bounties = pd.read_csv(bounty_path)
-        for idx, row in bounties.iterrows():
+        for idx, row in enumerate(bounties.fillna("").to_dict("records")):
             content = f"• {row['Short Description']}\n"
             content += f"  - Type: {row['Type']}\n"
             content += f"  - Value: {row['Value']}\n"
-            if pd.notna(row['GitHub Owner']) and row['GitHub Owner']:
+            if row['GitHub Owner']:
                 content += f"  - GitHub Owner: {row['GitHub Owner']}\n"
-            if pd.notna(row['Link']) and row['Link']:
+            if row['Link']:
                 content += f"  - Link: {row['Link']}\n"
-                
-            embedding = self.model.encode(content).tolist()
-            self.collection.add(ids=[f"bounty_{idx}"], embeddings=[embedding], documents=[content], metadatas=[{"source": "bounties.csv","type": "bounty","bounty_type": row['Type'],"value": row['Value']}])
+            metadata = {"source": "bounties.csv", "type": "bounty", "row": idx, "bounty_type": str(row['Type']), "value": str(row['Value']),
+                        "owner": str(row['GitHub Owner']), "has_owner": bool(row['GitHub Owner']), "link": str(row['Link'])}
+            # rows without a parseable value carry no value_usd, so range filters skip them
+            if (value := parse_value(row['Value'])) is not None: metadata["value_usd"] = value
+            yield f"bounty_{idx}", content, metadata
 
-    def index_tutorials(self, scraped_path: str = "data/tutorials"):
+    def tutorial_docs(self, scraped_path: str = "data/tutorials") -> Iterator[Doc]:
         for file in os.listdir(scraped_path):
             with open(os.path.join(scraped_path, file), "r") as f:
-                content = f.read()
-                embedding = self.model.encode(content).tolist()
-                self.collection.add(ids=[f"tutorial_{file}"],embeddings=[embedding],documents=[content],metadatas=[{"source": file, "type": "tutorial"}])
+                yield f"tutorial_{file}", f.read(), {"source": file, "type": "tutorial"}
+
+    def index_repo(self, repo_path: str = "data/tinygrad", commit: Optional[str] = None):
+        if commit is not None and commit == self.manifest.commit and self.manifest.docs("code"): return self._skipped("code")
+        stats = self.sync("code", self.repo_docs(repo_path))
+        if commit is not None:
+            self.manifest.data["commit"] = commit
+            self.manifest.save()
+        return stats
 
+    def index_bounties(self, bounty_path: str = "data/bounties.csv"):
+        # the sheet's hash, not the fetcher's report, decides: a run that fetched it but stopped before indexing
+        # leaves the fetcher answering "unchanged" from then on
+        digest = file_hash(bounty_path)
+        if digest == self.manifest.input_hash("bounties") and self.manifest.docs("bounty"): return self._skipped("bounty")
+        stats = self.sync("bounty", self.bounty_docs(bounty_path))
+        self.manifest.set_input_hash("bounties", digest)
+        self.manifest.save()
+        return stats
+
+    def index_tutorials(self, scraped_path: str = "data/tutorials"):
+        # every file is read and compared with its manifest hash, for the same reason; only changed ones are re-embedded
+        return self.sync("tutorial", self.tutorial_docs(scraped_path))
 
+    def index_all(self, repo_path: str = "data/tinygrad", bounty_path: str = "data/bounties.csv", scraped_path: str = "data/tutorials", commit: Optional[str] = None):
+        results = [self.index_repo(repo_path, commit), self.index_bounties(bounty_path), self.index_tutorials(scraped_path)]
+        total = {key: sum(r[key] for r in results) for key in ("docs", "seconds", "deleted", "unchanged")}
+        total["docs_per_sec"] = total["docs"] / total["seconds"] if total["seconds"] > 0 else 0.0
+        return total
@@ -0,0 +1,125 @@
+import os
+import re
+import math
+import heapq
+import pickle
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+_STOPWORDS = {"a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i", "in", "is", "it", "of",
+              "on", "or", "the", "this", "to", "what", "when", "where", "which", "who", "why", "with", "you", "my", "me", "use", "used"}
+
+
+def tokenize(text: str) -> List[str]:
+    # every identifier is kept whole (lowercased) and also split on snake_case and camelCase boundaries,
+    # so "ShapeTracker" matches "shapetracker", "shape" and "tracker"
+    terms = []
+    for identifier in _IDENTIFIER.findall(text):
+        whole = identifier.lower()
+        if whole not in _STOPWORDS: terms.append(whole)
+        parts = [p.lower() for piece in identifier.split("_") for p in _CAMEL.findall(piece)]
+        if len(parts) > 1: terms.extend(p for p in parts if len(p) > 1 and p not in _STOPWORDS)
+    return terms
+
+
+def identifier_terms(query: str) -> List[str]:
+    # words that look like code rather than english: `quoted`, CamelCase, ALLCAPS, snake_case, dotted, call()s, letters+digits
+    found = []
+    for word in query.split():
+        stripped = word.strip("?,;:!'\"")
+        quoted = stripped.startswith("`") and stripped.endswith("`") and len(stripped) > 2
+        stripped = stripped.strip("`").rstrip("()").rstrip(".")
+        if not _IDENTIFIER.fullmatch(stripped.replace(".", "_")): continue
+        if quoted or "_" in stripped or "." in stripped or word.rstrip("?,;:!").endswith("()") or \
+           re.search(r"[a-z][A-Z]|[A-Z]{2}[a-z]", stripped) or (stripped.isupper() and len(stripped) > 2) or \
+           re.fullmatch(r"[A-Za-z]+\d+[A-Za-z0-9]*", stripped):
+            found.extend(part.lower() for part in stripped.split("."))
+    return found
+
+
+# words allowed between symbols in a symbol-only query
+_CONNECTIVES = {"vs", "versus", "and", "or", "&"}
+
+
+def is_identifier_query(query: str, terms: List[str]) -> bool:
+    # nothing but symbols, bare or `quoted`: "UOp", "`realize` vs `schedule`", "Tensor.realize()". Any english word
+    # ("how does the JIT work", "what does BEAM do") keeps the query on the hybrid path: a lone acronym in a question
+    # would otherwise hand ranking to BM25, which favours short bounty rows over whole tutorial files
+    words = [word for word in query.split() if word.strip("?,;:!'\"").lower() not in _CONNECTIVES]
+    return bool(terms) and bool(words) and all(identifier_terms(word) for word in words)
+
+
+class LexicalIndex:
+    # BM25 over an inverted index of identifier terms, kept next to the vector store and updated
+    # by the indexer on the same upserts and deletes; stores chunk text so hits need no vector store round trip
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1, self.b = k1, b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.docs: Dict[str, Tuple[str, Dict[str, Any], int]] = {}
+        self.total_length = 0
+        self.version = None
+
+    @classmethod
+    def load(cls, path: str) -> Optional["LexicalIndex"]:
+        try:
+            with open(path, "rb") as f: data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError): return None
+        index = cls(path)
+        index.postings, index.docs, index.version = data["postings"], data["docs"], data["version"]
+        index.total_length = sum(length for _, _, length in index.docs.values())
+        return index
+
+    def save(self, version: int):
+        self.version = version
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f: pickle.dump({"version": version, "postings": self.postings, "docs": self.docs}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+
+    def __len__(self): return len(self.docs)
+
+    def __contains__(self, term: str): return term in self.postings
+
+    def add(self, doc_id: str, text: str, metadata: Dict[str, Any]):
+        self.remove([doc_id])
+        terms = Counter(tokenize(text))
+        for term, tf in terms.items(): self.postings.setdefault(term, {})[doc_id] = tf
+        length = sum(terms.values())
+        self.docs[doc_id] = (text, metadata, length)
+        self.total_length += length
+
+    def add_many(self, docs: Iterable[Tuple[str, str, Dict[str, Any]]]):
+        for doc_id, text, metadata in docs: self.add(doc_id, text, metadata)
+
+    def remove(self, doc_ids: Iterable[str]):
+        for doc_id in doc_ids:
+            if doc_id not in self.docs: continue
+            text, _, length = self.docs.pop(doc_id)
+            self.total_length -= length
+            for term in set(tokenize(text)):
+                postings = self.postings.get(term)
+                if postings is None: continue
+                postings.pop(doc_id, None)
+                if not postings: del self.postings[term]
+
+    def clear(self):
+        self.postings, self.docs, self.total_length = {}, {}, 0
+
+    def search(self, query: str, top_k: int = 10, types: Optional[Tuple[str, ...]] = None, exclude_types: Tuple[str, ...] = (), terms: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        if not self.docs: return []
+        n, avg_length = len(self.docs), self.total_length / len(self.docs)
+        scores: Dict[str, float] = {}
+        for term in dict.fromkeys(terms if terms is not None else tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings: continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                length = self.docs[doc_id][2]
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_length))
+        if types is not None or exclude_types:
+            allowed = lambda doc_type: (types is None or doc_type in types) and doc_type not in exclude_types
+            scores = {doc_id: score for doc_id, score in scores.items() if allowed(self.docs[doc_id][1].get("type"))}
+        return [{"id": doc_id, "content": self.docs[doc_id][0], "metadata": self.docs[doc_id][1], "score": scores[doc_id]}
+                for doc_id in heapq.nlargest(top_k, scores, key=scores.get)]
@@ -0,0 +1,64 @@
+import os
+import json
+import hashlib
+from typing import Dict, Optional
+
+
+def content_hash(content) -> str:
+    if isinstance(content, str): content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""): h.update(block)
+    return h.hexdigest()
+
+
+def read_manifest(path: str) -> Dict:
+    try:
+        with open(path, "r") as f: return json.load(f)
+    except (OSError, ValueError): return {}
+
+
+def read_version(path: str) -> int:
+    return read_manifest(path).get("version", 0)
+
+
+class Manifest:
+    # persistent record of what is in the vector store: one content hash per source document,
+    # the hash of whole input files, the tinygrad commit and a version bumped on every change
+    def __init__(self, path: str):
+        self.path = path
+        self.data = {"version": 0, "schema": None, "model": None, "commit": None, "inputs": {}, "docs": {}}
+        if os.path.exists(path):
+            with open(path, "r") as f: self.data.update(json.load(f))
+
+    @property
+    def version(self) -> int: return self.data["version"]
+
+    @property
+    def commit(self) -> Optional[str]: return self.data["commit"]
+
+    def docs(self, source: str) -> Dict[str, str]:
+        return self.data["docs"].setdefault(source, {})
+
+    def input_hash(self, name: str) -> Optional[str]:
+        return self.data["inputs"].get(name)
+
+    def set_input_hash(self, name: str, digest: str):
+        self.data["inputs"][name] = digest
+
+    def reset(self, model: Optional[str] = None, schema: Optional[int] = None):
+        self.data.update({"schema": schema, "model": model, "commit": None, "inputs": {}, "docs": {}})
+        self.bump()
+
+    def bump(self):
+        self.data["version"] += 1
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f: json.dump(self.data, f)
+        os.replace(tmp, self.path)
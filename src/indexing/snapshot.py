@@ -0,0 +1,152 @@
+import io
+import os
+import json
+import time
+import tarfile
+from typing import Any, Dict, Optional
+import numpy as np
+from src.indexing.manifest import Manifest, read_manifest, content_hash
+from src.indexing.lexical import LexicalIndex
+from src.store.vector_store import open_store
+
+# bump whenever the members or their layout change; older readers refuse newer snapshots
+SNAPSHOT_FORMAT = 1
+INFO, MANIFEST, VECTORS, RECORDS = "snapshot.json", "manifest.json", "vectors.npy", "records.json"
+# chroma rejects upserts above ~5.4k rows
+LOAD_BATCH = 4096
+
+
+def data_hash(manifest: Dict[str, Any]) -> str:
+    # one digest over every input file hash and per-document content hash, i.e. over what was embedded
+    return content_hash(json.dumps({"inputs": manifest.get("inputs", {}), "docs": manifest.get("docs", {})}, sort_keys=True))
+
+
+def default_name(manifest: Dict[str, Any]) -> str:
+    commit = (manifest.get("commit") or "unknown")[:12]
+    return f"tinypilot-index-{commit}-{manifest.get('model') or 'unknown'}.tar.gz"
+
+
+def export_snapshot(persist_directory: str = "./chroma_db", collection_name: str = "tinygrad_data", output_path: Optional[str] = None) -> Dict[str, Any]:
+    # the whole embedded index as one gzipped tar: vectors as a float32 .npy, ids/documents/metadata as JSON, the
+    # index manifest, and snapshot.json first (model, tinygrad commit, data hash and a sha256 per member), so the
+    # header can be read without decompressing the rest
+    manifest = read_manifest(os.path.join(persist_directory, "manifest.json"))
+    if not manifest.get("model"): raise FileNotFoundError(f"no index manifest in {persist_directory}, run main.py first")
+    kind = manifest.get("store", "chroma")
+    ids, vectors, documents, metadatas = open_store(kind, persist_directory, collection_name, partitioned=manifest.get("partitioned", False)).export()
+    if not ids: raise ValueError(f"the {collection_name} collection in {persist_directory} is empty")
+
+    buffer = io.BytesIO()
+    np.save(buffer, np.ascontiguousarray(vectors, dtype=np.float32))
+    members = {
+        MANIFEST: json.dumps(manifest).encode("utf-8"),
+        VECTORS: buffer.getvalue(),
+        RECORDS: json.dumps({"ids": ids, "documents": documents, "metadatas": metadatas}).encode("utf-8"),
+    }
+    info = {"format": SNAPSHOT_FORMAT, "collection": collection_name, "store": kind, "model": manifest["model"], "schema": manifest.get("schema"),
+            "commit": manifest.get("commit"), "data_hash": data_hash(manifest), "count": len(ids), "dim": int(vectors.shape[1]),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "sha256": {name: content_hash(data) for name, data in members.items()}}
+
+    output_path = output_path or default_name(manifest)
+    tmp = f"{output_path}.tmp"
+    with tarfile.open(tmp, "w:gz", compresslevel=6) as tar:
+        for name, data in [(INFO, json.dumps(info, indent=2).encode("utf-8")), *members.items()]:
+            member = tarfile.TarInfo(name)
+            member.size, member.mtime = len(data), int(time.time())
+            tar.addfile(member, io.BytesIO(data))
+    os.replace(tmp, output_path)
+    return {**info, "path": output_path, "bytes": os.path.getsize(output_path)}
+
+
+def read_info(path: str) -> Dict[str, Any]:
+    # just the header; it is the first member, so only the start of the file is decompressed
+    with tarfile.open(path, "r:gz") as tar:
+        member = tar.next()
+        if member is None or member.name != INFO: raise ValueError(f"{path} is not a tinypilot index snapshot")
+        info = json.load(tar.extractfile(member))
+    if info.get("format") != SNAPSHOT_FORMAT: raise ValueError(f"{path} has snapshot format {info.get('format')}, this version reads {SNAPSHOT_FORMAT}")
+    return info
+
+
+def is_current(info: Dict[str, Any], persist_directory: str = "./chroma_db") -> bool:
+    # whether the index on disk was loaded from (or built identically to) this snapshot
+    manifest = read_manifest(os.path.join(persist_directory, "manifest.json"))
+    return (bool(manifest.get("docs")) and manifest.get("model") == info["model"] and manifest.get("commit") == info["commit"]
+            and manifest.get("store", "chroma") == info["store"] and data_hash(manifest) == info["data_hash"])
+
+
+def import_snapshot(path: str, persist_directory: str = "./chroma_db", collection_name: Optional[str] = None, store: Optional[str] = None,
+                    expected_model: Optional[str] = None) -> Dict[str, Any]:
+    # replaces the index in persist_directory with the snapshot's. Members are only ever read into memory, never
+    # extracted to paths, and each is checked against its sha256 before anything on disk is touched
+    start = time.perf_counter()
+    info = read_info(path)
+    if expected_model and info["model"] != expected_model:
+        raise ValueError(f"snapshot {path} was embedded with {info['model']}, but this index uses {expected_model}; "
+                         f"rebuild it with main.py or export a snapshot made with {expected_model}")
+    members = {}
+    with tarfile.open(path, "r:gz") as tar:
+        for member in tar:
+            if member.name in info["sha256"] and member.isfile(): members[member.name] = tar.extractfile(member).read()
+    for name, digest in info["sha256"].items():
+        if name not in members: raise ValueError(f"snapshot {path} is missing {name}")
+        if content_hash(members[name]) != digest: raise ValueError(f"snapshot {path} is corrupt: {name} does not match its checksum")
+
+    manifest = json.loads(members[MANIFEST])
+    records = json.loads(members[RECORDS])
+    vectors = np.load(io.BytesIO(members[VECTORS]), allow_pickle=False)
+    ids, documents, metadatas = records["ids"], records["documents"], records["metadatas"]
+    if not (len(ids) == len(documents) == len(metadatas) == info["count"]) or vectors.shape != (info["count"], info["dim"]) or len(set(ids)) != len(ids):
+        raise ValueError(f"snapshot {path} is inconsistent: counts or vector shape do not match its header")
+    if manifest.get("model") != info["model"] or data_hash(manifest) != info["data_hash"]:
+        raise ValueError(f"snapshot {path} is inconsistent: its manifest does not match its header")
+
+    # drop the manifest first: an interrupted load then reads as "no index" rather than a stale one
+    os.makedirs(persist_directory, exist_ok=True)
+    manifest_path = os.path.join(persist_directory, "manifest.json")
+    previous = read_manifest(manifest_path).get("version", 0)
+    if os.path.exists(manifest_path): os.remove(manifest_path)
+
+    kind, collection_name = store or info["store"], collection_name or info["collection"]
+    target = open_store(kind, persist_directory, collection_name, create=True, partitioned=True)
+    if target.count(): target.reset()
+    for offset in range(0, len(ids), LOAD_BATCH):
+        end = offset + LOAD_BATCH
+        target.upsert(ids[offset:end], vectors[offset:end], documents[offset:end], metadatas[offset:end])
+    target.flush()
+
+    index = Manifest(manifest_path)
+    index.data.update(manifest)
+    # above both the old and the exported version, so running retrievers drop their caches
+    index.data.update({"version": max(previous, manifest.get("version", 0)) + 1, "store": kind, "partitioned": True})
+    lexical = LexicalIndex(os.path.join(persist_directory, "lexical.pkl"))
+    lexical.add_many(zip(ids, documents, metadatas))
+    lexical.save(index.version)
+    index.save()
+    return {**info, "store": kind, "seconds": time.perf_counter() - start}
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Export the embedded index to one compressed file, or load one")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write the current index to a snapshot")
+    export.add_argument("-o", "--output", default=None, help="default: tinypilot-index-<commit>-<model>.tar.gz")
+    load = commands.add_parser("import", help="replace the current index with a snapshot")
+    load.add_argument("snapshot")
+    load.add_argument("--store", choices=["chroma", "flat"], default=None, help="vector store to load into (default: the one it was exported from)")
+    load.add_argument("--model", default=None, help="refuse snapshots embedded with any other model")
+    info = commands.add_parser("info", help="print a snapshot's header")
+    info.add_argument("snapshot")
+    for command in (export, load):
+        command.add_argument("--persist-directory", default="./chroma_db")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        result = export_snapshot(args.persist_directory, output_path=args.output)
+        print(f"exported {result['count']} docs ({result['model']}, commit {(result['commit'] or 'unknown')[:12]}) to {result['path']} ({result['bytes'] / 1e6:.1f} MB)")
+    elif args.command == "import":
+        result = import_snapshot(args.snapshot, args.persist_directory, store=args.store, expected_model=args.model)
+        print(f"loaded {result['count']} docs ({result['model']}, commit {(result['commit'] or 'unknown')[:12]}) into {result['store']} in {result['seconds']:.2f}s")
+    else:
+        print(json.dumps(read_info(args.snapshot), indent=2))
@@ -1,10 +1,14 @@
-import requests
+import os
+from typing import List, Optional
+from src.manager.refresh import Fetcher
 
-def bounties(bounty_path="data/bounties.csv"):
-    url = "https://docs.google.com/spreadsheets/d/1WKHbT-7KOgjEawq5h5Ic1qUWzpfAzuD_J06N1JwOCGs/export?format=csv&gid=0"
-    response = requests.get(url)
-    if response.status_code == 200: 
+BOUNTIES_URL = "https://docs.google.com/spreadsheets/d/1WKHbT-7KOgjEawq5h5Ic1qUWzpfAzuD_J06N1JwOCGs/export?format=csv&gid=0"
+
+def bounties(bounty_path="data/bounties.csv", url=BOUNTIES_URL, fetcher: Optional[Fetcher] = None) -> List[str]:
+    # returns [bounty_path] when the sheet changed, [] when it is unchanged or could not be fetched
+    def write(_, content):
+        os.makedirs(os.path.dirname(os.path.abspath(bounty_path)), exist_ok=True)
         with open(bounty_path, "wb") as f:
-            f.write(response.content)
-        return True
-    return False
\ No newline at end of file
+            f.write(content)
+        return bounty_path
+    return (fetcher or Fetcher()).refresh([url], write)["changed"]
@@ -0,0 +1,75 @@
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import requests
+from src.indexing.manifest import content_hash
+
+
+class Fetcher:
+    # conditional, concurrent HTTP fetches: remembers ETag / Last-Modified and a content hash per URL,
+    # so an unchanged page costs one 304 (or one hash comparison) and is never re-extracted or rewritten
+    def __init__(self, cache_path: str = "data/fetch_cache.json", workers: int = 8, timeout: float = 30.0, session: Optional[requests.Session] = None):
+        self.cache_path = cache_path
+        self.workers = workers
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.cache: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        if os.path.exists(cache_path):
+            with open(cache_path, "r") as f: self.cache = json.load(f)
+
+    def fetch(self, url: str) -> Dict[str, Any]:
+        with self.lock: entry = dict(self.cache.get(url, {}))
+        headers = {}
+        # validators and the stored hash only count while the output they describe still exists
+        stored = bool(entry) and (entry.get("path") is None or os.path.exists(entry["path"]))
+        if stored:
+            if entry.get("etag"): headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"): headers["If-Modified-Since"] = entry["last_modified"]
+        try: response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e: return {"url": url, "status": "failed", "error": str(e), "entry": entry}
+        if response.status_code == 304: return {"url": url, "status": "unchanged", "entry": entry}
+        if response.status_code != 200: return {"url": url, "status": "failed", "error": f"HTTP {response.status_code}", "entry": entry}
+
+        digest = content_hash(response.content)
+        # servers that send neither ETag nor Last-Modified are caught here, by the content hash
+        unchanged = stored and entry.get("hash") == digest
+        entry.update({"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified"), "hash": digest})
+        return {"url": url, "status": "unchanged" if unchanged else "changed", "content": response.content, "entry": entry}
+
+    def commit(self, url: str, entry: Dict[str, Any]):
+        # recorded only once the caller has stored the output, so a failed write is retried next run
+        with self.lock: self.cache[url] = entry
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        tmp = f"{self.cache_path}.tmp"
+        with self.lock, open(tmp, "w") as f: json.dump(self.cache, f)
+        os.replace(tmp, self.cache_path)
+
+    def refresh(self, urls: Iterable[str], process: Callable[[str, bytes], Optional[str]]) -> Dict[str, List[str]]:
+        # fetch every URL on a bounded pool; process(url, content) runs in the worker for changed pages only
+        # and returns the path it wrote. Returns the changed paths plus unchanged and failed URLs.
+        def run(url):
+            result = self.fetch(url)
+            if result["status"] == "changed":
+                try: path = process(url, result["content"])
+                except Exception as e: return {**result, "status": "failed", "error": str(e)}
+                if path is None: return {**result, "status": "failed", "error": "nothing extracted"}
+                result["entry"]["path"] = path
+            if result["status"] != "failed": self.commit(url, result["entry"])
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="refresh") as pool:
+            results = list(pool.map(run, dict.fromkeys(urls)))
+        self.save()
+        summary = {"changed": [], "unchanged": [], "failed": []}
+        for result in results:
+            if result["status"] == "failed": print(f"Failed to fetch {result['url']}: {result['error']}")
+            summary[result["status"]].append(result["entry"]["path"] if result["status"] == "changed" else result["url"])
+        return summary
@@ -12,4 +12,5 @@ def update_repo(repo_path="data/tinygrad"):
     if local_hash != remote_hash:
         print(f"Updating {repo_path} from {local_hash} to {remote_hash}")
     else: print(f"No updates for {repo_path}")
+    return local_hash
 
@@ -1,22 +1,28 @@
-import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 import os
 import trafilatura
+from typing import List, Optional
+from src.manager.refresh import Fetcher
 
-def scrape_tutorials(base_url="https://mesozoic-egg.github.io/tinygrad-notes/", output_dir="data/tutorials"):
+def scrape_tutorials(base_url="https://mesozoic-egg.github.io/tinygrad-notes/", output_dir="data/tutorials", fetcher: Optional[Fetcher] = None) -> List[str]:
+    # returns the paths of tutorial files that were (re)written; unchanged pages are neither extracted nor rewritten
     os.makedirs(output_dir, exist_ok=True)
-    response = requests.get(base_url)
-    soup = BeautifulSoup(response.content, "html.parser")
-    internal_links = [urljoin(base_url, a["href"]) for a in soup.find_all("a", href=True) if a["href"].startswith("/") or a["href"].startswith(base_url)]
-    visited = set()
-    for link in internal_links:
-        if link not in visited:
-            visited.add(link)
-            try:
-                downloaded = trafilatura.fetch_url(link)
-                text_content = trafilatura.extract(downloaded)
-                with open(os.path.join(output_dir, f"{link.split('/')[-1]}.txt"), "w") as f:
-                    f.write(text_content)
-            except Exception as e:
-                print(f"Failed to scrape {link}: {e}")
+    fetcher = fetcher or Fetcher()
+    index = fetcher.fetch(base_url)
+    if index["status"] == "changed":
+        soup = BeautifulSoup(index["content"], "html.parser")
+        index["entry"]["links"] = [urljoin(base_url, a["href"]) for a in soup.find_all("a", href=True) if a["href"].startswith("/") or a["href"].startswith(base_url)]
+    if index["status"] == "failed": print(f"Failed to scrape {base_url}: {index['error']}")
+    else: fetcher.commit(base_url, index["entry"])
+    internal_links = index["entry"].get("links", [])
+
+    def extract(link, content):
+        text_content = trafilatura.extract(content)
+        if text_content is None: return None
+        path = os.path.join(output_dir, f"{link.split('/')[-1]}.txt")
+        with open(path, "w") as f:
+            f.write(text_content)
+        return path
+
+    return fetcher.refresh(internal_links, extract)["changed"]
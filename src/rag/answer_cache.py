@@ -0,0 +1,121 @@
+import json
+import sqlite3
+import threading
+import numpy as np
+from typing import Callable, List, Optional, Dict, Any, Tuple
+from src.rag.retriever import normalize_query, query_numbers
+from src.rag.bounty_query import is_bounty_query, parse_bounty_query
+
+
+def _filters(query: str) -> str:
+    # "bounties with an owner" and "bounties without an owner" embed almost identically too; their metadata filters differ
+    return json.dumps(parse_bounty_query(query)["filters"], sort_keys=True) if is_bounty_query(query) else ""
+
+
+class AnswerCache:
+    # answers keyed by question embedding; a new question within `threshold` cosine similarity of a
+    # cached one, asked against the same index version, gets the stored answer without touching the LLM.
+    # Questions answered without an embedding (symbol-only and pure bounty filter queries never encode one)
+    # are stored under their normalized text and only match the same text
+    # write: queues (sql, values) statements on a background writer (HistoryStore.write) so storing an answer never
+    # waits on a commit; without one, writes commit synchronously on this cache's own connection
+    def __init__(self, db_path: str = "chat_history.db", threshold: float = 0.92, max_entries: int = 5000, write: Optional[Callable[[List[tuple]], None]] = None):
+        self.threshold = threshold
+        self.write = write
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS answer_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                query TEXT,
+                embedding BLOB,
+                answer TEXT,
+                index_version INTEGER
+            )
+        """)
+        self.conn.commit()
+        rows = self.conn.execute("SELECT query, embedding, answer, index_version FROM answer_cache ORDER BY id DESC LIMIT ?", (max_entries,)).fetchall()[::-1]
+        # text-keyed entries: normalized query -> (answer, index_version), oldest first
+        self.exact: Dict[str, Tuple[str, int]] = {normalize_query(row[0]): (row[2], row[3]) for row in rows if row[1] is None}
+        rows = [row for row in rows if row[1] is not None]
+        self.queries: List[str] = [row[0] for row in rows]
+        self.filters: List[str] = [_filters(query) for query in self.queries]
+        self.answers: List[str] = [row[2] for row in rows]
+        self.versions = np.array([row[3] for row in rows], dtype=np.int64)
+        self.matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows]) if rows else None
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _lookup_text(self, query: str, index_version: int) -> Optional[Dict[str, Any]]:
+        key = normalize_query(query)
+        entry = self.exact.get(key)
+        if entry is not None and entry[1] == index_version: return {"query": query, "answer": entry[0], "similarity": 1.0}
+        for i in range(len(self.queries) - 1, -1, -1):
+            if self.versions[i] == index_version and normalize_query(self.queries[i]) == key:
+                return {"query": self.queries[i], "answer": self.answers[i], "similarity": 1.0}
+        return None
+
+    def lookup(self, query: str, embedding, index_version: int) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            if embedding is None: return self._lookup_text(query, index_version)
+            vector = self._unit(embedding)
+            if self.matrix is None or self.matrix.shape[1] != vector.shape[0]: return None
+            similarities = self.matrix @ vector
+            similarities[self.versions != index_version] = -1.0
+            numbers, filters = query_numbers(query), _filters(query)
+            for i, cached_query in enumerate(self.queries):
+                if similarities[i] >= self.threshold and (query_numbers(cached_query) != numbers or self.filters[i] != filters): similarities[i] = -1.0
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold: return None
+            return {"query": self.queries[best], "answer": self.answers[best], "similarity": float(similarities[best])}
+
+    def store(self, query: str, embedding, answer: str, index_version: int):
+        vector = self._unit(embedding) if embedding is not None else None
+        key = normalize_query(query)
+        with self.lock:
+            # a regenerated answer replaces the earlier ones for the same question; lookups would otherwise keep
+            # returning the oldest of the rows that match it equally well
+            replaced = sorted({cached for cached in self.queries if normalize_query(cached) == key} | {query})
+            statements = [("DELETE FROM answer_cache WHERE query = ?", (cached,)) for cached in replaced] + [
+                ("INSERT INTO answer_cache (query, embedding, answer, index_version) VALUES (?, ?, ?, ?)",
+                 (query, vector.tobytes() if vector is not None else None, answer, index_version)),
+                # answers produced against an older index can never be served again
+                ("DELETE FROM answer_cache WHERE index_version != ?", (index_version,)),
+                ("DELETE FROM answer_cache WHERE id <= (SELECT MAX(id) FROM answer_cache) - ?", (self.max_entries,)),
+            ]
+            if self.write is not None: self.write(statements)
+            else:
+                with self.conn:
+                    for sql, values in statements: self.conn.execute(sql, values)
+            self.exact = {cached: entry for cached, entry in self.exact.items() if entry[1] == index_version}
+            keep = (self.versions == index_version) & np.array([normalize_query(cached) != key for cached in self.queries], dtype=bool)
+            if self.matrix is None or not keep.any() or (vector is not None and self.matrix.shape[1] != vector.shape[0]):
+                self.queries, self.filters, self.answers, self.matrix, self.versions = [], [], [], None, np.zeros(0, dtype=np.int64)
+            elif not keep.all():
+                self.queries = [q for q, k in zip(self.queries, keep) if k]
+                self.filters = [f for f, k in zip(self.filters, keep) if k]
+                self.answers = [a for a, k in zip(self.answers, keep) if k]
+                self.matrix, self.versions = self.matrix[keep], self.versions[keep]
+
+            self.exact.pop(key, None)
+            if vector is None:
+                self.exact[key] = (answer, index_version)
+                while len(self.exact) > self.max_entries: self.exact.pop(next(iter(self.exact)))
+                return
+            self.queries.append(query)
+            self.filters.append(_filters(query))
+            self.answers.append(answer)
+            self.matrix = vector[None, :] if self.matrix is None else np.vstack([self.matrix, vector])
+            self.versions = np.append(self.versions, index_version)
+            if len(self.queries) > self.max_entries:
+                self.queries, self.filters, self.answers = self.queries[-self.max_entries:], self.filters[-self.max_entries:], self.answers[-self.max_entries:]
+                self.matrix, self.versions = self.matrix[-self.max_entries:], self.versions[-self.max_entries:]
+
+    def close(self):
+        self.conn.close()
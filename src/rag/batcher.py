@@ -0,0 +1,58 @@
+import asyncio
+from concurrent.futures import Executor
+from typing import Callable, List, Optional
+
+
+class EmbeddingBatcher:
+    # coalesces concurrent single-query encodes into one batched model call; a batch closes when it
+    # reaches max_batch or max_wait seconds after its first query arrived
+    def __init__(self, encode_many: Callable[[List[str]], List[List[float]]], max_batch: int = 32, max_wait: float = 0.005, executor: Optional[Executor] = None):
+        self.encode_many = encode_many
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.executor = executor
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.queries = 0
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.worker is None: return
+        self.worker.cancel()
+        try: await self.worker
+        except asyncio.CancelledError: pass
+        self.worker = None
+
+    async def embed(self, query: str) -> List[float]:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((query, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0: break
+                try: batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError: break
+            batch = [(query, future) for query, future in batch if not future.done()]
+            if not batch: continue
+            try:
+                embeddings = await loop.run_in_executor(self.executor, self.encode_many, [query for query, _ in batch])
+                for (_, future), embedding in zip(batch, embeddings):
+                    if not future.done(): future.set_result(embedding)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done(): future.set_exception(e)
+            self.batches += 1
+            self.queries += len(batch)
+
+    def stats(self):
+        return {"batches": self.batches, "queries": self.queries, "avg_batch": self.queries / self.batches if self.batches else 0.0}
@@ -0,0 +1,83 @@
+import re
+from typing import Dict, Any, List, Optional
+
+BOUNTY_TYPES = {t.lower(): t for t in ["Feature", "Bugfix", "Speed", "Refactor", "Upgrade", "Torch", "MLPerf", "MI300X"]}
+
+# "k" only as a word of its own: "2k" is 2000, "300 kernels" is 300
+_AMOUNT = r"\$?\s*(\d[\d,]*(?:\.\d+)?)\s*(?:(k)\b)?"
+_MIN = re.compile(r"(over|above|more than|greater than|>|at least|min(?:imum)?|>=|from)\s*" + _AMOUNT, re.I)
+_MAX = re.compile(r"(under|below|less than|<|at most|max(?:imum)?|up to|<=)\s*" + _AMOUNT, re.I)
+_STRICT = {"over", "above", "more than", "greater than", ">", "under", "below", "less than", "<"}
+_BETWEEN = re.compile(r"between\s*" + _AMOUNT + r"\s*(?:and|-|to)\s*" + _AMOUNT, re.I)
+# an exact value: "$500", "worth 500", "500 dollar bounties"
+_EXACT = [re.compile(r"\$\s*(\d[\d,]*(?:\.\d+)?)\s*(?:(k)\b)?"), re.compile(r"\b(?:worth|paying|pays?)\s*" + _AMOUNT, re.I),
+          re.compile(r"(\d[\d,]*(?:\.\d+)?)\s*(?:(k)\b)?\s*(?:dollars?|usd)\b", re.I)]
+# "open" and "available" only when they describe the bounty: "open bounties", "bounties that are still available",
+# not "bounties for the open source AMD driver"
+_NO_OWNER = re.compile(r"\b(?:without (?:an? )?owner|no owner|unowned|unclaimed|unassigned|not (?:yet )?(?:claimed|taken|locked)|"
+                       r"(?:(?:open|available)(?= (?:\w+ )?bount)|(?<=bounties )(?:open|available)|(?:are|is|still|currently) (?:still )?(?:open|available))\b(?! source))", re.I)
+_OWNER = re.compile(r"\b(?:with (?:an? )?owner|has (?:an? )?owner|owned|claimed|taken|locked|assigned)\b", re.I)
+# words that carry no topic once the filters are pulled out; if nothing else is left the query is a pure filter
+_FILLER = set("""a an the me my show list give get find what which who are is there any all every bounty bounties
+    latest current new newest recent please tinygrad of for with without in on and or that worth paying pay
+    value valued type types kind usd dollars dollar how many much do does have has owner owners currently right now
+    about related to""".split())
+
+
+def is_bounty_query(query: str) -> bool:
+    return "bounty" in query.lower() or "bounties" in query.lower()
+
+
+def parse_value(value) -> Optional[float]:
+    # "$1,000" -> 1000.0, "2k" -> 2000.0, anything unparseable -> None
+    match = re.search(_AMOUNT, str(value), re.I)
+    if not match: return None
+    amount = float(match.group(1).replace(",", ""))
+    return amount * 1000 if match.group(2) else amount
+
+
+def _amount(number: str, k: Optional[str]) -> float:
+    return float(number.replace(",", "")) * (1000 if k else 1)
+
+
+def parse_bounty_query(query: str) -> Dict[str, Any]:
+    text, filters = query, {}
+    if match := _BETWEEN.search(text):
+        low, high = sorted([_amount(*match.group(1, 2)), _amount(*match.group(3, 4))])
+        filters["min_value"], filters["max_value"] = low, high
+        text = text.replace(match.group(0), " ")
+    for key, pattern in (("min_value", _MIN), ("max_value", _MAX)):
+        if key not in filters and (match := pattern.search(text)):
+            filters[key] = _amount(*match.group(2, 3))
+            if match.group(1).lower() in _STRICT: filters[f"{key}_exclusive"] = True
+            text = text.replace(match.group(0), " ")
+    for pattern in _EXACT:
+        if "min_value" in filters or "max_value" in filters: break
+        if match := pattern.search(text):
+            filters["value"] = _amount(*match.group(1, 2))
+            text = text.replace(match.group(0), " ")
+            break
+    if match := _NO_OWNER.search(text):
+        filters["has_owner"] = False
+        text = text.replace(match.group(0), " ")
+    elif match := _OWNER.search(text):
+        filters["has_owner"] = True
+        text = text.replace(match.group(0), " ")
+    words = re.findall(r"[\w]+", text.lower())
+    types = [BOUNTY_TYPES[w] for w in words if w in BOUNTY_TYPES]
+    if types: filters["bounty_type"] = types[0] if len(types) == 1 else types
+
+    # a number left over is one no filter understood; the query is then not a pure filter and takes the dense path
+    remaining = [w for w in words if w not in BOUNTY_TYPES and w not in _FILLER]
+    return {"filters": filters, "pure": not remaining, "where": bounty_where(filters)}
+
+
+def bounty_where(filters: Dict[str, Any]) -> Dict[str, Any]:
+    conditions: List[Dict[str, Any]] = [{"type": "bounty"}]
+    if "value" in filters: conditions.append({"value_usd": filters["value"]})
+    if "min_value" in filters: conditions.append({"value_usd": {"$gt" if filters.get("min_value_exclusive") else "$gte": filters["min_value"]}})
+    if "max_value" in filters: conditions.append({"value_usd": {"$lt" if filters.get("max_value_exclusive") else "$lte": filters["max_value"]}})
+    if "has_owner" in filters: conditions.append({"has_owner": filters["has_owner"]})
+    if isinstance(filters.get("bounty_type"), list): conditions.append({"bounty_type": {"$in": filters["bounty_type"]}})
+    elif "bounty_type" in filters: conditions.append({"bounty_type": filters["bounty_type"]})
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
@@ -0,0 +1,47 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+
+class TTLCache:
+    # bounded LRU whose entries also expire after ttl seconds
+    def __init__(self, maxsize: int = 256, ttl: float = 600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None: del self.data[key]
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def __contains__(self, key: Hashable) -> bool:
+        # peek without touching LRU order or the hit/miss counters
+        with self.lock:
+            entry = self.data.get(key)
+            return entry is not None and time.monotonic() - entry[0] <= self.ttl
+
+    def put(self, key: Hashable, value: Any):
+        with self.lock:
+            self.data[key] = (time.monotonic(), value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize: self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock: self.data.clear()
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.data)}
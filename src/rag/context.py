@@ -0,0 +1,141 @@
+import re
+from typing import List, Dict, Optional, Tuple, Set
+
+_WORD = re.compile(r"\w+")
+
+
+class TokenCounter:
+    def __init__(self, model_name: str = "gpt-4o-mini"):
+        self.model_name = model_name
+        self._encoding, self._loaded = None, False
+
+    @property
+    def encoding(self):
+        # tiktoken may need to download its tables; load on first count rather than at construction
+        if not self._loaded:
+            try:
+                import tiktoken
+                try: self._encoding = tiktoken.encoding_for_model(self.model_name)
+                except KeyError: self._encoding = tiktoken.get_encoding("o200k_base")
+            except Exception:
+                self._encoding = None
+            self._loaded = True
+        return self._encoding
+
+    def __call__(self, text: str) -> int:
+        if self.encoding is not None: return len(self.encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0: return ""
+        if self.encoding is not None: return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:max_tokens])
+        return text[:max_tokens * 4]
+
+
+def _shingles(text: str, n: int = 3) -> Set[Tuple[str, ...]]:
+    words = _WORD.findall(text.lower())
+    return {tuple(words[i:i + n]) for i in range(max(len(words) - n + 1, 1))}
+
+
+class ContextPacker:
+    # splits retrieved docs into passages, scores them against the query, drops near-duplicates
+    # and greedily fills a token budget per source type
+    def __init__(self, max_tokens: int = 3000, model_name: str = "gpt-4o-mini", passage_tokens: int = 250, tutorial_share: float = 0.6, dedup_threshold: float = 0.8, overlap_weight: float = 0.5):
+        self.count = TokenCounter(model_name)
+        self.max_tokens = max_tokens
+        self.passage_tokens = passage_tokens
+        self.tutorial_share = tutorial_share
+        self.dedup_threshold = dedup_threshold
+        self.overlap_weight = overlap_weight
+
+    def passages(self, doc: Dict) -> List[str]:
+        # paragraphs packed up to passage_tokens; short docs (code chunks, bounties) stay whole
+        content = doc["content"]
+        if self.count(content) <= self.passage_tokens: return [content]
+        passages, current, size = [], [], 0
+        for paragraph in (p for p in re.split(r"\n\s*\n|\n(?=\S)", content) if p.strip()):
+            tokens = self.count(paragraph)
+            if current and size + tokens > self.passage_tokens:
+                passages.append("\n".join(current))
+                current, size = [], 0
+            current.append(paragraph)
+            size += tokens
+        if current: passages.append("\n".join(current))
+        return passages
+
+    def _candidates(self, query: str, docs: List[Dict]) -> List[Dict]:
+        terms = set(_WORD.findall(query.lower()))
+        candidates = []
+        for doc_idx, doc in enumerate(docs):
+            for passage_idx, passage in enumerate(self.passages(doc)):
+                words = set(_WORD.findall(passage.lower()))
+                overlap = len(terms & words) / len(terms) if terms else 0.0
+                candidates.append({"doc": doc_idx, "idx": passage_idx, "text": passage, "tokens": self.count(passage),
+                                   "score": doc["score"] + self.overlap_weight * overlap})
+        return sorted(candidates, key=lambda c: c["score"], reverse=True)
+
+    def _select(self, candidates: List[Dict], budget: int, header_tokens, chosen_shingles: Optional[List[Set]]) -> Tuple[List[Dict], int]:
+        selected, used, opened = [], 0, set()
+        for candidate in candidates:
+            cost = candidate["tokens"] + (header_tokens(candidate["doc"]) if candidate["doc"] not in opened else 0)
+            if used + cost > budget: continue
+            if chosen_shingles is not None:
+                shingles = _shingles(candidate["text"])
+                if any(len(shingles & other) / max(len(shingles | other), 1) >= self.dedup_threshold for other in chosen_shingles): continue
+                chosen_shingles.append(shingles)
+            selected.append(candidate)
+            opened.add(candidate["doc"])
+            used += cost
+        if not selected and candidates:
+            # nothing fits whole: keep the best passage, cut to the budget
+            best = dict(candidates[0])
+            best["text"] = self.count.truncate(best["text"], budget - header_tokens(best["doc"]))
+            if best["text"]:
+                if chosen_shingles is not None: chosen_shingles.append(_shingles(best["text"]))
+                selected, used = [best], self.count(best["text"]) + header_tokens(best["doc"])
+        return selected, used
+
+    def _render(self, docs: List[Dict], selected: List[Dict], header=None) -> str:
+        by_doc: Dict[int, List[Dict]] = {}
+        for candidate in selected: by_doc.setdefault(candidate["doc"], []).append(candidate)
+        sections = []
+        for doc_idx in sorted(by_doc, key=lambda d: docs[d]["score"], reverse=True):
+            body = "\n\n".join(c["text"] for c in sorted(by_doc[doc_idx], key=lambda c: c["idx"]))
+            sections.append(f"{header(docs[doc_idx])}{body}" if header else body)
+        return "\n\n".join(sections)
+
+    def pack(self, query: str, docs: List[Dict], bounty: bool = False) -> Tuple[str, int]:
+        shingles: List[Set] = []
+        if bounty:
+            # every bounty row is distinct even when the wording is close, so no dedup here
+            selected, _ = self._select(self._candidates(query, docs), self.max_tokens, lambda d: 0, None)
+            context = self._render(docs, selected)
+            return context, self.count(context)
+
+        tutorials = [doc for doc in docs if doc["metadata"].get("type") == "tutorial"]
+        others = [doc for doc in docs if doc["metadata"].get("type") != "tutorial"]
+        tutorial_header = lambda doc: f"=== Tutorial: {doc['metadata']['source']} ===\n\n"
+        budget = self.max_tokens - self.count("=== TUTORIAL CONTENT ===\n\n\n\n=== ADDITIONAL CONTEXT ===\n\n")
+        tutorial_budget = int(budget * self.tutorial_share) if others else budget
+        tutorial_candidates = self._candidates(query, tutorials)
+        selected_tutorials, used = self._select(tutorial_candidates, tutorial_budget,
+                                                lambda d: self.count(tutorial_header(tutorials[d])), shingles)
+        # whatever the tutorials did not use goes to code and bounties
+        selected_others, used_others = self._select(self._candidates(query, others), budget - used, lambda d: 0, shingles)
+        # and whatever those did not use goes back to the tutorial passages that missed their share. Only passages
+        # that fit whole are offered, so this pass never cuts one down to fill the gap
+        spare, taken = budget - used - used_others, {(c["doc"], c["idx"]) for c in selected_tutorials}
+        opened = {doc for doc, _ in taken}
+        if spare > 0 and tutorials:
+            header_tokens = lambda d: 0 if d in opened else self.count(tutorial_header(tutorials[d]))
+            rest = [c for c in tutorial_candidates if (c["doc"], c["idx"]) not in taken and c["tokens"] + header_tokens(c["doc"]) <= spare]
+            selected_tutorials += self._select(rest, spare, header_tokens, shingles)[0]
+
+        tutorial_context = self._render(tutorials, selected_tutorials, tutorial_header)
+        other_context = self._render(others, selected_others)
+        context = ""
+        if tutorial_context:
+            context = f"=== TUTORIAL CONTENT ===\n\n{tutorial_context}\n\n"
+        if other_context:
+            context += f"=== ADDITIONAL CONTEXT ===\n\n{other_context}"
+        return context, self.count(context)
@@ -0,0 +1,50 @@
+import re
+import time
+import asyncio
+from typing import Iterator, AsyncIterator, Optional
+
+
+class FakeMessage:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeChatModel:
+    # offline stand-in for ChatOpenAI: same invoke/ainvoke/stream/astream surface, emits a canned answer
+    # word by word on a fixed schedule so streaming, timeouts and concurrency can be exercised locally
+    def __init__(self, response: Optional[str] = None, first_token_delay: float = 0.05, token_delay: float = 0.01):
+        self.response = response
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.calls = 0
+
+    def _answer(self, prompt) -> str:
+        if self.response is not None: return self.response
+        question = re.search(r"Question:\s*(.*)", str(prompt))
+        return f"This is a stub answer to: {question.group(1).strip() if question else 'your question'}"
+
+    def _tokens(self, prompt) -> list:
+        self.calls += 1
+        return re.findall(r"\S+\s*", self._answer(prompt))
+
+    def invoke(self, prompt) -> FakeMessage:
+        tokens = self._tokens(prompt)
+        time.sleep(self.first_token_delay + self.token_delay * len(tokens))
+        return FakeMessage("".join(tokens))
+
+    async def ainvoke(self, prompt) -> FakeMessage:
+        tokens = self._tokens(prompt)
+        await asyncio.sleep(self.first_token_delay + self.token_delay * len(tokens))
+        return FakeMessage("".join(tokens))
+
+    def stream(self, prompt) -> Iterator[FakeMessage]:
+        time.sleep(self.first_token_delay)
+        for token in self._tokens(prompt):
+            yield FakeMessage(token)
+            time.sleep(self.token_delay)
+
+    async def astream(self, prompt) -> AsyncIterator[FakeMessage]:
+        await asyncio.sleep(self.first_token_delay)
+        for token in self._tokens(prompt):
+            yield FakeMessage(token)
+            await asyncio.sleep(self.token_delay)
@@ -1,16 +1,23 @@
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
-from functools import lru_cache
 import asyncio
-from typing import List, Dict
+import threading
+from typing import List, Dict, AsyncIterator, Tuple
 import os
 from dotenv import load_dotenv
+from src.rag.context import ContextPacker
+from src.rag.bounty_query import is_bounty_query
+from src.rag.tracing import span, set_counter
 
 load_dotenv()
 
 class Generator:
-    def __init__(self, model_name="gpt-4o-mini-2024-07-18"):
-        self.llm = ChatOpenAI(model_name=model_name, temperature=0.0, api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(self, model_name="gpt-4o-mini-2024-07-18", context_tokens=3000, llm=None):
+        # langchain is imported on first use (or by warm_up) to keep startup fast
+        self.model_name = model_name
+        self._llm = llm
+        self._prompts = None
+        self._load_lock = threading.Lock()
+        self.packer = ContextPacker(max_tokens=context_tokens, model_name=model_name)
+        self.last_usage = {"context_tokens": 0, "prompt_tokens": 0}
         self.default_template = """
             You are a helpful assistant answering questions about the tinygrad codebase and related concepts.
             
@@ -73,53 +80,76 @@ class Generator:
 
             Answer: Let me list the relevant bounties:
             """
-            
-        self.default_prompt = PromptTemplate(input_variables=["query", "context"], template=self.default_template)
-        self.bounty_prompt = PromptTemplate(input_variables=["query", "context"], template=self.bounty_template)
 
-    @lru_cache(maxsize=100)
-    def _format_context(self, context: str) -> str:
-        return context
+    @property
+    def llm(self):
+        with self._load_lock:
+            if self._llm is None:
+                from langchain_openai import ChatOpenAI
+                self._llm = ChatOpenAI(model_name=self.model_name, temperature=0.0, api_key=os.getenv("OPENAI_API_KEY"))
+            return self._llm
+
+    @property
+    def default_prompt(self):
+        return self._load_prompts()[0]
+
+    @property
+    def bounty_prompt(self):
+        return self._load_prompts()[1]
+
+    def _load_prompts(self):
+        with self._load_lock:
+            if self._prompts is None:
+                from langchain.prompts import PromptTemplate
+                self._prompts = (PromptTemplate(input_variables=["query", "context"], template=self.default_template),
+                                 PromptTemplate(input_variables=["query", "context"], template=self.bounty_template))
+            return self._prompts
+
+    def warm_up(self):
+        def load():
+            try:
+                self.llm
+                self._load_prompts()
+                self.packer.count("warm up")
+            except Exception: pass
+        thread = threading.Thread(target=load, name="generator-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def prepare(self, query: str, retrieved_docs: List[Dict]) -> Tuple[str, Dict[str, int]]:
+        bounty_query = is_bounty_query(query)
+        bounty_docs = [doc for doc in retrieved_docs if doc["metadata"].get("type") == "bounty"]
+        if bounty_query and bounty_docs: retrieved_docs = bounty_docs
+
+        context, context_tokens = self.packer.pack(query, retrieved_docs, bounty=bounty_query and bool(bounty_docs))
+        prompt_template = self.bounty_prompt if bounty_query else self.default_prompt
+        prompt = prompt_template.format(query=query, context=context)
+        return prompt, {"context_tokens": context_tokens, "prompt_tokens": self.packer.count(prompt)}
+
+    def build_prompt(self, query: str, retrieved_docs: List[Dict]) -> str:
+        with span("prompt_assembly"): prompt, self.last_usage = self.prepare(query, retrieved_docs)
+        set_counter("prompt_tokens", self.last_usage["prompt_tokens"])
+        return prompt
 
     async def generate_async(self, query: str, retrieved_docs: List[Dict]) -> str:
-        is_bounty_query = "bounty" in query.lower() or "bounties" in query.lower()
-        
-        if is_bounty_query:
-            bounty_docs = [doc for doc in retrieved_docs if doc["metadata"].get("type") == "bounty"]
-            if bounty_docs:
-                retrieved_docs = bounty_docs
-                top_docs = sorted(bounty_docs, key=lambda x: x["score"], reverse=True)
-                context = "\n\n".join([doc["content"] for doc in top_docs])
-        else:
-            tutorial_docs = [doc for doc in retrieved_docs if doc["metadata"].get("type") == "tutorial"]
-            other_docs = [doc for doc in retrieved_docs if doc["metadata"].get("type") != "tutorial"]
-            sorted_tutorials = sorted(tutorial_docs, key=lambda x: x["score"], reverse=True)
-            sorted_others = sorted(other_docs, key=lambda x: x["score"], reverse=True)
-            
-            tutorial_context = ""
-            if sorted_tutorials:
-                tutorial_sections = []
-                for doc in sorted_tutorials:
-                    section = f"=== Tutorial: {doc['metadata']['source']} ===\n\n"
-                    section += doc["content"]
-                    tutorial_sections.append(section)
-                tutorial_context = "\n\n".join(tutorial_sections)
-            
-            other_context = "\n\n".join([doc["content"] for doc in sorted_others])
-            
-            context = ""
-            if tutorial_context:
-                context = f"=== TUTORIAL CONTENT ===\n\n{tutorial_context}\n\n"
-            if other_context:
-                context += f"=== ADDITIONAL CONTEXT ===\n\n{other_context}"
-
-        formatted_context = self._format_context(context)
-        prompt_template = self.bounty_prompt if is_bounty_query else self.default_prompt
-        prompt = prompt_template.format(query=query, context=formatted_context)
+        # packing tokenizes every passage; keep it off the event loop so concurrent callers overlap
+        prompt = await asyncio.to_thread(self.build_prompt, query, retrieved_docs)
         
         loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(None, lambda: self.llm.invoke(prompt))
+        with span("llm"): response = await loop.run_in_executor(None, lambda: self.llm.invoke(prompt))
+        set_counter("completion_tokens", self.packer.count(response.content))
         return response.content
 
+    async def stream_async(self, query: str, retrieved_docs: List[Dict]) -> AsyncIterator[str]:
+        # "llm" covers the whole stream including time the consumer spends between tokens
+        prompt = self.build_prompt(query, retrieved_docs)
+        completion = []
+        with span("llm"):
+            async for chunk in self.llm.astream(prompt):
+                if chunk.content:
+                    completion.append(chunk.content)
+                    yield chunk.content
+        set_counter("completion_tokens", self.packer.count("".join(completion)))
+
     def generate(self, query: str, retrieved_docs: List[Dict]) -> str:
         return asyncio.run(self.generate_async(query, retrieved_docs))
\ No newline at end of file
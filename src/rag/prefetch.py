@@ -0,0 +1,102 @@
+import time
+import threading
+from typing import Any, Dict, Optional
+from src.rag.retriever import normalize_query, query_numbers
+from src.indexing.lexical import tokenize
+
+
+def closely_extends(prefetched: str, query: str) -> bool:
+    # query is prefetched plus text that adds no search term: punctuation or stopwords ("how does the jit work" ->
+    # "how does the jit work?"). A half-typed last word is a different term ("wor" is not "work"), so it is not reused;
+    # neither is a half-typed number, which tokenize drops ("bounties over $5" is not "bounties over $500")
+    if not query.startswith(prefetched): return False
+    return query == prefetched or (tokenize(query) == tokenize(prefetched) and query_numbers(query) == query_numbers(prefetched))
+
+
+class Prefetcher:
+    # speculative retrieval while the question is still being typed: once typing pauses for `pause` seconds, a
+    # background thread embeds the partial input and retrieves for it. Keystrokes that move the input away from
+    # what is being prefetched make that work stale; it is abandoned between the embed and the search and its
+    # result discarded. On submit, a result for the same question (or one it closely extends) is reused, so only
+    # the LLM call is left on the critical path. Nothing speculative is written to the retriever's caches
+    def __init__(self, retriever, pause: float = 0.3, min_chars: int = 8, top_k: int = 5):
+        self.retriever = retriever
+        self.pause = pause
+        self.min_chars = min_chars
+        self.top_k = top_k
+        self.changed = threading.Condition()
+        self.text = ""          # normalized input as of the last keystroke
+        self.typed_at = 0.0
+        self.pending: Optional[str] = None   # input waiting for a pause to be prefetched
+        self.inflight: Optional[str] = None  # input being prefetched right now
+        self.result: Optional[Dict[str, Any]] = None
+        self.closed = False
+        self.stats = {"started": 0, "stale": 0, "failed": 0, "submitted": 0, "hits": 0, "saved_seconds": 0.0}
+        self.worker = threading.Thread(target=self._worker, name="retrieval-prefetch", daemon=True)
+        self.worker.start()
+
+    def update(self, text: str):
+        # called on every keystroke with the whole input so far
+        key = normalize_query(text)
+        with self.changed:
+            self.text, self.typed_at = key, time.monotonic()
+            done = self.result is not None and self.result["key"] == key
+            self.pending = key if len(key) >= self.min_chars and not done and key != self.inflight else None
+            self.changed.notify_all()
+
+    def _stale(self, key: str) -> bool:
+        return not closely_extends(key, self.text)
+
+    def _worker(self):
+        while True:
+            with self.changed:
+                while not self.closed:
+                    wait = self.typed_at + self.pause - time.monotonic()
+                    if self.pending is not None and wait <= 0: break
+                    self.changed.wait(wait if self.pending is not None else None)
+                if self.closed: return
+                key, self.pending, self.inflight = self.pending, None, self.pending
+                self.stats["started"] += 1
+            result, failed = None, False
+            try: result = self._prefetch(key)
+            except Exception: failed = True  # speculative: the real query reports its own errors
+            with self.changed:
+                self.inflight = None
+                if failed: self.stats["failed"] += 1
+                elif result is None or self._stale(key): self.stats["stale"] += 1
+                else: self.result = result
+                self.changed.notify_all()
+
+    def _prefetch(self, key: str) -> Optional[Dict[str, Any]]:
+        started = time.perf_counter()
+        index_version = self.retriever.check_index_version()
+        # None for questions retrieval answers without the model, as on the non-speculative path
+        embedding = self.retriever.embed(key, cache=False) if self.retriever.needs_embedding(key, self.top_k) else None
+        if self._stale(key): return None
+        docs = self.retriever.retrieve(key, self.top_k, embedding, cache=False)
+        return {"key": key, "embedding": embedding, "docs": docs, "index_version": index_version, "started": started, "finished": time.perf_counter()}
+
+    def take(self, query: str) -> Optional[Dict[str, Any]]:
+        # on submit: the prefetched embedding and docs if they answer `query`, else None. A prefetch of this very
+        # question that is still running is waited for, since it is already partway through
+        submitted, key = time.perf_counter(), normalize_query(query)
+        with self.changed:
+            self.pending = None
+            while self.inflight is not None and closely_extends(self.inflight, key): self.changed.wait()
+            result, self.result = self.result, None
+            self.stats["submitted"] += 1
+        if result is None or not closely_extends(result["key"], key) or result["index_version"] != self.retriever.check_index_version(): return None
+        # the part of the retrieval that ran before Enter was pressed
+        saved = min(result["finished"], submitted) - result["started"]
+        self.stats["hits"] += 1
+        self.stats["saved_seconds"] += saved
+        return {**result, "docs": [dict(doc) for doc in result["docs"]], "saved": saved}
+
+    def hit_rate(self) -> float:
+        return self.stats["hits"] / self.stats["submitted"] if self.stats["submitted"] else 0.0
+
+    def close(self):
+        with self.changed:
+            self.closed = True
+            self.changed.notify_all()
+        self.worker.join()
@@ -1,78 +1,187 @@
-import chromadb
-from sentence_transformers import SentenceTransformer
+import os
+import re
+import threading
+from src.embedding.backend import get_backend
+from src.store.vector_store import open_store
+from src.rag.cache import TTLCache
+from src.rag.tracing import span, count, set_counter
+from src.indexing.manifest import read_manifest, read_version
+from src.indexing.lexical import LexicalIndex, identifier_terms, is_identifier_query
+from src.rag.bounty_query import is_bounty_query, parse_bounty_query
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+def query_numbers(query):
+    # "bounties over $300" and "bounties over $500" embed almost identically and tokenize alike, but ask different things
+    return frozenset(re.findall(r"\d+", query.replace(",", "")))
+
+def sources(docs):
+    return [{"source": doc["metadata"].get("source"), "type": doc["metadata"].get("type"), "score": doc["score"]} for doc in docs]
+
+def reciprocal_rank_fusion(rankings, limit, k=60):
+    # score = sum of 1 / (k + rank) over the rankings a doc appears in, scaled so a doc ranked first everywhere scores 1.0
+    rankings, fused, docs = [ranking for ranking in rankings if ranking], {}, {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            fused[doc["id"]] = fused.get(doc["id"], 0.0) + 1.0 / (k + rank)
+            docs.setdefault(doc["id"], doc)
+    best = max(len(rankings), 1) / (k + 1)
+    return [{**docs[doc_id], "score": fused[doc_id] / best} for doc_id in sorted(fused, key=fused.get, reverse=True)[:limit]]
 
 class Retriever:
-    def __init__(self, collection_name="tinygrad_data", persist_directory="./chroma_db"):
-        self.model = SentenceTransformer("all-MiniLM-L6-v2")
-        self.client = chromadb.PersistentClient(path=persist_directory)
-        self.collection = self.client.get_collection(collection_name)
-
-    def retrieve(self, query, top_k=5):
-        query_embedding = self.model.encode(query).tolist()
-        
-        if "bounty" in query.lower() or "bounties" in query.lower():
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=100,
-                where={"type": "bounty"},
-                include=["metadatas", "documents", "distances"]
-            )
-            
-            retrieved_docs = []
-            for i in range(len(results["documents"][0])):
-                doc = results["documents"][0][i]
-                if doc is None: continue
-                    
-                metadata = results["metadatas"][0][i]
-                score = 1.0 - results["distances"][0][i]
-                
-                if "$" in query:
-                    query_parts = query.split("$")
-                    if len(query_parts) > 1:
-                        value_part = query_parts[1].split()[0]
-                        if value_part.isdigit():
-                            target_value = f"${value_part}"
-                            if metadata.get("value") != target_value:
-                                continue
-                            
-                retrieved_docs.append({"content": doc, "metadata": metadata, "score": score})
-            retrieved_docs = sorted(retrieved_docs, key=lambda x: x["score"], reverse=True)[:20]
+    def __init__(self, collection_name="tinygrad_data", persist_directory="./chroma_db", cache_size=256, cache_ttl=600.0, model_name="all-MiniLM-L6-v2", backend="fp32", store=None):
+        # the embedding model and vector store are opened on first use (or by warm_up), so constructing a Retriever is cheap
+        if not os.path.isdir(persist_directory): raise FileNotFoundError(f"no index found at {persist_directory}")
+        self.collection_name = collection_name
+        self.persist_directory = persist_directory
+        self.model_name = model_name
+        # query encoder: "int8" or "onnx" trade a little precision for latency, see verify_backend
+        self.backend = get_backend(backend, model_name)
+        self.store_kind = store
+        self._store = None
+        self._store_lock = threading.Lock()
+        self.embedding_cache = TTLCache(cache_size, cache_ttl)
+        self.results_cache = TTLCache(cache_size, cache_ttl)
+        self.manifest_path = os.path.join(persist_directory, "manifest.json")
+        # vectors from one model are meaningless to another, so never query an index embedded with a different one
+        indexed_model = read_manifest(self.manifest_path).get("model")
+        if indexed_model and indexed_model != model_name:
+            raise ValueError(f"the index at {persist_directory} was embedded with {indexed_model}, not {model_name}; rebuild it with main.py or load a matching snapshot")
+        self.manifest_mtime = None
+        self.index_version = None
+        self.lexical_path = os.path.join(persist_directory, "lexical.pkl")
+        self._lexical = None
+        self._lexical_lock = threading.Lock()
+
+    @property
+    def store(self):
+        # whichever store the indexer wrote, as recorded in the manifest, unless one was asked for explicitly
+        with self._store_lock:
+            if self._store is None:
+                manifest = read_manifest(self.manifest_path)
+                kind = self.store_kind or manifest.get("store", "chroma")
+                self._store = open_store(kind, self.persist_directory, self.collection_name, partitioned=manifest.get("partitioned", False))
+            return self._store
+
+    @property
+    def lexical(self):
+        # None when the index predates the lexical index; retrieval is then dense only
+        with self._lexical_lock:
+            if self._lexical is None: self._lexical = LexicalIndex.load(self.lexical_path) or False
+            return self._lexical or None
+
+    def warm_up(self):
+        # load the model and open the vector store in the background while the user types the first question
+        def load():
+            # failures resurface on the first real query, where the UI reports them
+            try:
+                self.lexical
+                self.store
+                self.backend.encode_query("warm up")
+            except Exception: pass
+        thread = threading.Thread(target=load, name="retriever-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def check_index_version(self):
+        # the indexer bumps the manifest version whenever the collection changes; cached results die with it
+        try: mtime = os.stat(self.manifest_path).st_mtime_ns
+        except OSError: mtime = None
+        if mtime == self.manifest_mtime: return self.index_version
+        self.manifest_mtime = mtime
+        version = read_version(self.manifest_path)
+        if version != self.index_version:
+            self.index_version = version
+            self.results_cache.clear()
+            with self._lexical_lock: self._lexical = None
+            if self._store is not None: self._store.refresh()
+        return self.index_version
+
+    def cache_stats(self):
+        return {"embedding": self.embedding_cache.stats(), "results": self.results_cache.stats()}
+
+    def embed(self, query, cache=True):
+        # cache=False (speculative work) still reads the cache but never evicts real entries with its results
+        key = normalize_query(query)
+        embedding = self.embedding_cache.get(key)
+        if embedding is None:
+            with span("embed"): embedding = self.backend.encode_query(key)
+            if cache: self.embedding_cache.put(key, embedding)
+        else: count("embedding_cache_hit")
+        return embedding
+
+    def embed_many(self, queries):
+        # one batched encode for every query not already in the embedding cache
+        keys = [normalize_query(query) for query in queries]
+        embeddings = {key: self.embedding_cache.get(key) for key in dict.fromkeys(keys)}
+        missing = [key for key, embedding in embeddings.items() if embedding is None]
+        if missing:
+            for key, embedding in zip(missing, self.backend.encode(missing, batch_size=len(missing)).tolist()):
+                embeddings[key] = embedding
+                self.embedding_cache.put(key, embedding)
+        return [embeddings[key] for key in keys]
+
+    def needs_embedding(self, query, top_k=5):
+        self.check_index_version()
+        if (normalize_query(query), top_k) in self.results_cache: return False
+        if is_bounty_query(query): return not parse_bounty_query(query)["pure"]
+        return self._lexical_terms(query) is None
+
+    def _lexical_terms(self, query):
+        # symbol-only queries whose symbols are all in the lexical index skip the embedding model entirely
+        terms, lexical = identifier_terms(query), self.lexical
+        if lexical is None or not is_identifier_query(query, terms) or not all(term in lexical for term in terms): return None
+        return terms
+
+    def _lexical_search(self, query, top_k):
+        # same shape as the dense search: up to 10 tutorial passages plus top_k of everything else
+        with span("lexical_search"):
+            return (self.lexical.search(query, 10, types=("tutorial",)), self.lexical.search(query, top_k, exclude_types=("tutorial",)))
+
+    def retrieve(self, query, top_k=5, query_embedding=None, cache=True):
+        self.check_index_version()
+        key = (normalize_query(query), top_k)
+        retrieved_docs = self.results_cache.get(key)
+        if retrieved_docs is None:
+            retrieved_docs = self._retrieve(query, top_k, query_embedding)
+            if cache: self.results_cache.put(key, retrieved_docs)
+        else: count("retrieval_cache_hit")
+        set_counter("docs_retrieved", len(retrieved_docs))
+        return [dict(doc) for doc in retrieved_docs]
+
+    def _retrieve(self, query, top_k, query_embedding=None):
+        if is_bounty_query(query):
+            parsed = parse_bounty_query(query)
+            if parsed["pure"]:
+                # pure filter questions are answered straight from the metadata, no embedding or ANN search
+                with span("vector_search"): retrieved_docs = self.store.get(where=parsed["where"])
+                by_value = any(key in parsed["filters"] for key in ("value", "min_value", "max_value"))
+                return sorted(retrieved_docs, key=lambda x: (-x["metadata"].get("value_usd", 0) if by_value else 0, x["metadata"].get("row", 0)))
+
+            query_embedding = query_embedding or self.embed(query)
+            # bounties have their own exactly-searched collection, so the top 20 need no oversampling
+            with span("vector_search"): retrieved_docs = self.store.query(query_embedding, 20, where=parsed["where"])
+            retrieved_docs = sorted(retrieved_docs, key=lambda x: x["score"], reverse=True)
             return retrieved_docs
-            
+
         else:
-            tutorial_results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=10,
-                where={"type": "tutorial"},
-                include=["metadatas", "documents", "distances"]
-            )
-            
-            other_results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k,
-                where={"type": {"$ne": "tutorial"}},
-                include=["metadatas", "documents", "distances"]
-            )
-            
-            retrieved_docs = []
-            
-            for i in range(len(tutorial_results["documents"][0])):
-                doc = tutorial_results["documents"][0][i]
-                if doc is None: continue
-                retrieved_docs.append({
-                    "content": doc,
-                    "metadata": tutorial_results["metadatas"][0][i],
-                    "score": 1.0 - tutorial_results["distances"][0][i]
-                })
-            
-            for i in range(len(other_results["documents"][0])):
-                doc = other_results["documents"][0][i]
-                if doc is None: continue
-                retrieved_docs.append({
-                    "content": doc,
-                    "metadata": other_results["metadatas"][0][i],
-                    "score": 1.0 - other_results["distances"][0][i]
-                })
-            
-            retrieved_docs = sorted(retrieved_docs, key=lambda x: x["score"], reverse=True)
+            if self._lexical_terms(query) is not None:
+                tutorials, others = self._lexical_search(query, top_k)
+                best = max((doc["score"] for doc in tutorials + others), default=1.0)
+                return sorted(({**doc, "score": doc["score"] / best} for doc in tutorials + others), key=lambda x: x["score"], reverse=True)
+
+            query_embedding = query_embedding or self.embed(query)
+            with span("vector_search"):
+                # one search per group: up to 10 tutorial passages, top_k of everything else (with per-source
+                # collections, the tutorial, code and bounty searches run in parallel)
+                tutorial_docs, other_docs = self.store.query_groups(query_embedding, [(10, {"type": "tutorial"}), (top_k, {"type": {"$ne": "tutorial"}})])
+
+            if self.lexical is not None:
+                # hybrid: fuse dense and BM25 rankings per group so exact symbol matches surface next to semantic ones
+                lexical_tutorials, lexical_others = self._lexical_search(query, top_k)
+                tutorial_docs = reciprocal_rank_fusion([tutorial_docs, lexical_tutorials], 10)
+                other_docs = reciprocal_rank_fusion([other_docs, lexical_others], top_k)
+
+            retrieved_docs = sorted(tutorial_docs + other_docs, key=lambda x: x["score"], reverse=True)
             return retrieved_docs
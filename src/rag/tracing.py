@@ -0,0 +1,69 @@
+import time
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# stage durations (seconds) and counters stored next to each interaction in chat_history.db
+# prefetch_saved is the retrieval time a speculative prefetch took off the critical path
+STAGES = ["answer_cache", "embed", "lexical_search", "vector_search", "prompt_assembly", "llm", "first_token", "render", "total", "prefetch_saved"]
+COUNTERS = ["docs_retrieved", "prompt_tokens", "completion_tokens", "answer_cache_hit", "retrieval_cache_hit", "embedding_cache_hit", "prefetch_hit"]
+
+
+class Trace:
+    def __init__(self):
+        self.durations: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+
+    def add(self, stage: str, seconds: float):
+        self.durations[stage] = self.durations.get(stage, 0.0) + seconds
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    def set(self, name: str, value: int):
+        self.counters[name] = int(value)
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar("tinypilot_trace", default=None)
+
+
+def start_trace() -> Trace:
+    trace = Trace()
+    _current.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def span(stage: str):
+    # no-op cost when nothing is tracing: one contextvar lookup and two perf_counter calls
+    start = time.perf_counter()
+    try: yield
+    finally:
+        trace = _current.get()
+        if trace is not None: trace.add(stage, time.perf_counter() - start)
+
+
+def record(stage: str, seconds: float):
+    trace = _current.get()
+    if trace is not None: trace.add(stage, seconds)
+
+
+def count(name: str, value: int = 1):
+    trace = _current.get()
+    if trace is not None: trace.count(name, value)
+
+
+def set_counter(name: str, value: int):
+    trace = _current.get()
+    if trace is not None: trace.set(name, value)
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples: return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "mean": sum(ordered) / len(ordered)}
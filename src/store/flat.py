@@ -0,0 +1,245 @@
+import os
+import sys
+import json
+import shutil
+import warnings
+import threading
+from typing import Any, Dict, Optional
+import numpy as np
+from src.store.vector_store import VectorStore, Hit
+
+# metadata column kinds: strings are dictionary-encoded (int32 codes, -1 = missing), numbers are float64 (NaN = missing),
+# bools are int8 (-1 = missing)
+
+
+def _kind(value) -> str:
+    if isinstance(value, bool): return "bool"
+    if isinstance(value, int): return "int"
+    if isinstance(value, float): return "float"
+    return "str"
+
+
+class FlatStore(VectorStore):
+    # exact search over a float16 matrix memory-mapped from {collection}.flat/<version>/vectors.npy: one matrix-vector
+    # product per query, metadata filters as boolean masks over columnar arrays. Every file is mapped read-only, so
+    # opening is near-instant and processes share pages through the OS page cache. Writes are staged in memory and
+    # flush() publishes a new version directory by atomically swapping the CURRENT pointer
+    def __init__(self, persist_directory: str, collection_name: str, create: bool = False):
+        self.root = os.path.join(persist_directory, f"{collection_name}.flat")
+        self.current_path = os.path.join(self.root, "CURRENT")
+        if not os.path.exists(self.current_path):
+            if not create: raise FileNotFoundError(f"no flat vector store at {self.root}")
+            os.makedirs(self.root, exist_ok=True)
+        self.version = None
+        self.pending: Optional[Dict[str, tuple]] = None
+        self.lock = threading.Lock()
+        self._open()
+
+    def _read_current(self) -> Optional[str]:
+        try:
+            with open(self.current_path, "r") as f: return f.read().strip()
+        except OSError: return None
+
+    def _open(self, retries: int = 3):
+        try: self._load(self._read_current())
+        except FileNotFoundError:
+            # a writer published a newer version and removed this one between reading CURRENT and opening it
+            if retries == 0: raise
+            self._open(retries - 1)
+
+    def _load(self, version: Optional[str]):
+        self.version = version
+        if version is None:
+            self.ids, self.vectors, self.sq_norms, self.columns, self.schema = [], np.zeros((0, 0), np.float16), np.zeros(0, np.float32), {}, {"count": 0, "columns": {}}
+            self.doc_offsets, self.doc_bytes = np.zeros(1, np.int64), np.zeros(0, np.uint8)
+            return
+        path = os.path.join(self.root, version)
+        with open(os.path.join(path, "schema.json"), "r") as f: self.schema = json.load(f)
+        self.ids = self.schema["ids"]
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        self.vectors, self.sq_norms, self.doc_offsets = load("vectors.npy"), load("sq_norms.npy"), load("doc_offsets.npy")
+        self.doc_bytes = np.memmap(os.path.join(path, "documents.bin"), dtype=np.uint8, mode="r") if self.doc_offsets[-1] else np.zeros(0, np.uint8)
+        self.columns = {key: load(column["file"]) for key, column in self.schema["columns"].items()}
+
+    def refresh(self):
+        with self.lock:
+            if self._read_current() != self.version: self._open()
+
+    # reads
+
+    def count(self) -> int:
+        with self.lock: return len(self.pending) if self.pending is not None else len(self.ids)
+
+    def _document(self, row: int) -> str:
+        return bytes(self.doc_bytes[self.doc_offsets[row]:self.doc_offsets[row + 1]]).decode("utf-8")
+
+    def _metadata(self, row: int) -> Dict[str, Any]:
+        metadata = {}
+        for key, column in self.schema["columns"].items():
+            value = self.columns[key][row]
+            if column["kind"] == "str":
+                if value >= 0: metadata[key] = column["values"][value]
+            elif column["kind"] == "bool":
+                if value >= 0: metadata[key] = bool(value)
+            elif not np.isnan(value): metadata[key] = int(value) if column["kind"] == "int" else float(value)
+        return metadata
+
+    def _hit(self, row: int, score: float = 1.0) -> Hit:
+        return {"id": self.ids[row], "content": self._document(row), "metadata": self._metadata(row), "score": score}
+
+    def _mask(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        # the subset of chroma's where syntax the retriever uses: equality, $ne, $gt/$gte/$lt/$lte, $in, $and/$or
+        if not where: return None
+        masks = []
+        for key, condition in where.items():
+            if key in ("$and", "$or"):
+                parts = [self._mask(part) for part in condition]
+                masks.append(np.logical_and.reduce(parts) if key == "$and" else np.logical_or.reduce(parts))
+                continue
+            op, value = next(iter(condition.items())) if isinstance(condition, dict) else ("$eq", condition)
+            masks.append(self._compare(key, op, value))
+        return np.logical_and.reduce(masks)
+
+    def _compare(self, key: str, op: str, value) -> np.ndarray:
+        column = self.schema["columns"].get(key)
+        if column is None: return np.zeros(len(self.ids), dtype=bool)
+        data = np.asarray(self.columns[key])
+        if column["kind"] == "str":
+            # compare dictionary codes; values never stored match nothing (and $ne everything present)
+            codes = {v: i for i, v in enumerate(column["values"])}
+            present = data >= 0
+            if op == "$in": return np.isin(data, [codes[v] for v in value if v in codes])
+            if op == "$nin": return present & ~np.isin(data, [codes[v] for v in value if v in codes])
+            code = codes.get(value, -2)
+            if op == "$eq": return data == code
+            if op == "$ne": return present & (data != code)
+            raise ValueError(f"unsupported operator {op} for string metadata {key!r}")
+        if column["kind"] == "bool":
+            data = np.where(data < 0, np.nan, data.astype(np.float64))
+        if op == "$in": return np.isin(data, [float(v) for v in value])
+        if op == "$nin": return ~np.isnan(data) & ~np.isin(data, [float(v) for v in value])
+        ops = {"$eq": np.equal, "$ne": np.not_equal, "$gt": np.greater, "$gte": np.greater_equal, "$lt": np.less, "$lte": np.less_equal}
+        if op not in ops: raise ValueError(f"unsupported operator {op} for metadata {key!r}")
+        with np.errstate(invalid="ignore"): return ~np.isnan(data) & ops[op](data, float(value))
+
+    def get(self, where=None, limit=None, offset=0):
+        with self.lock:
+            mask = self._mask(where)
+            rows = np.arange(len(self.ids)) if mask is None else np.flatnonzero(mask)
+            rows = rows[offset:offset + limit if limit is not None else None]
+            return [self._hit(int(row)) for row in rows]
+
+    def _dots(self, query: np.ndarray) -> np.ndarray:
+        # upcast to float32 for the product. torch's float16 -> float32 cast is several times faster than numpy's;
+        # use it when the embedding model has already loaded torch, never import it just for this
+        if "torch" in sys.modules:
+            import torch
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")  # the mapping is read-only and torch only reads it
+                vectors = torch.from_numpy(np.asarray(self.vectors))
+            return torch.mv(vectors.float(), torch.from_numpy(query)).numpy()
+        return np.asarray(self.vectors, dtype=np.float32) @ query
+
+    def query_groups(self, embedding, groups):
+        with self.lock:
+            if not self.ids: return [[] for _ in groups]
+            query = np.asarray(embedding, dtype=np.float32)
+            # squared L2 distance = |v|^2 - 2 v.q + |q|^2, with one matrix-vector product shared by every group
+            distances = self.sq_norms - 2 * self._dots(query) + float(query @ query)
+            results = []
+            for n_results, where in groups:
+                mask = self._mask(where)
+                candidates = np.arange(len(self.ids)) if mask is None else np.flatnonzero(mask)
+                k = min(n_results, len(candidates))
+                if k == 0:
+                    results.append([])
+                    continue
+                top = candidates[np.argpartition(distances[candidates], k - 1)[:k]]
+                top = top[np.argsort(distances[top], kind="stable")]
+                results.append([self._hit(int(row), 1.0 - float(distances[row])) for row in top])
+            return results
+
+    def query(self, embedding, n_results, where=None):
+        return self.query_groups(embedding, [(n_results, where)])[0]
+
+    def export(self):
+        with self.lock:
+            rows = range(len(self.ids))
+            return list(self.ids), np.asarray(self.vectors, dtype=np.float32), [self._document(row) for row in rows], [self._metadata(row) for row in rows]
+
+    # writes
+
+    def _stage(self) -> Dict[str, tuple]:
+        # load the published version into memory the first time it is modified
+        if self.pending is None:
+            self.pending = {doc_id: (np.array(self.vectors[row]), self._document(row), self._metadata(row)) for row, doc_id in enumerate(self.ids)}
+        return self.pending
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        with self.lock:
+            pending = self._stage()
+            for doc_id, embedding, document, metadata in zip(ids, embeddings, documents, metadatas):
+                pending[doc_id] = (np.asarray(embedding, dtype=np.float16), document, metadata)
+
+    def delete(self, ids):
+        with self.lock:
+            # deleting ids this store never held must not stage (and later rewrite) the whole version
+            if self.pending is None and set(self.ids).isdisjoint(ids): return
+            pending = self._stage()
+            for doc_id in ids: pending.pop(doc_id, None)
+
+    def reset(self):
+        with self.lock: self.pending = {}
+
+    def drop(self):
+        with self.lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self.pending = None
+            self._load(None)
+
+    def flush(self):
+        with self.lock:
+            if self.pending is None: return
+            rows = list(self.pending.items())
+            previous = self.version
+            version = f"v{int(previous[1:]) + 1 if previous else 1:06d}"
+            path = os.path.join(self.root, version)
+            shutil.rmtree(path, ignore_errors=True)
+            os.makedirs(path)
+
+            dim = len(rows[0][1][0]) if rows else 0
+            vectors = np.zeros((len(rows), dim), dtype=np.float16)
+            for i, (_, (vector, _, _)) in enumerate(rows): vectors[i] = vector
+            np.save(os.path.join(path, "vectors.npy"), vectors)
+            # norms of the stored float16 vectors, so distances are exact for what is actually searched
+            np.save(os.path.join(path, "sq_norms.npy"), np.einsum("ij,ij->i", vectors.astype(np.float32), vectors.astype(np.float32)))
+
+            encoded = [document.encode("utf-8") for _, (_, document, _) in rows]
+            np.save(os.path.join(path, "doc_offsets.npy"), np.concatenate([[0], np.cumsum([len(b) for b in encoded], dtype=np.int64)]).astype(np.int64))
+            with open(os.path.join(path, "documents.bin"), "wb") as f: f.write(b"".join(encoded))
+
+            columns = {}
+            for key in dict.fromkeys(key for _, (_, _, metadata) in rows for key in metadata):
+                kinds = {_kind(metadata[key]) for _, (_, _, metadata) in rows if key in metadata}
+                kind = "str" if "str" in kinds else "bool" if kinds == {"bool"} else "int" if kinds <= {"int", "bool"} else "float"
+                values = [metadata.get(key) for _, (_, _, metadata) in rows]
+                column = {"kind": kind, "file": f"column_{len(columns)}.npy"}
+                if kind == "str":
+                    column["values"] = sorted({str(v) for v in values if v is not None})
+                    codes = {v: i for i, v in enumerate(column["values"])}
+                    data = np.array([codes[str(v)] if v is not None else -1 for v in values], dtype=np.int32)
+                elif kind == "bool":
+                    data = np.array([int(v) if v is not None else -1 for v in values], dtype=np.int8)
+                else:
+                    data = np.array([float(v) if v is not None else np.nan for v in values], dtype=np.float64)
+                np.save(os.path.join(path, column["file"]), data)
+                columns[key] = column
+
+            with open(os.path.join(path, "schema.json"), "w") as f: json.dump({"count": len(rows), "dim": dim, "ids": [doc_id for doc_id, _ in rows], "columns": columns}, f)
+            tmp = f"{self.current_path}.tmp"
+            with open(tmp, "w") as f: f.write(version)
+            os.replace(tmp, self.current_path)
+            # readers that still map the previous version keep their open files; only the directory entry goes
+            if previous: shutil.rmtree(os.path.join(self.root, previous), ignore_errors=True)
+            self.pending = None
+            self._open()
@@ -0,0 +1,127 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from src.store.vector_store import STORES, VectorStore, ChromaStore, Hit
+from src.store.flat import FlatStore
+
+# one collection per source type, each indexed for its size (None = exact search over a flat matrix). Every
+# partition scores hits as 1 - squared L2 distance in the same embedding space, so hits from different partitions
+# are already on one scale and merge by score directly
+PARTITIONS: Dict[str, Optional[Dict[str, int]]] = {
+    # thousands of code chunks: a denser graph and a wider beam than chroma's defaults (16 / 100 / 100) keep recall up
+    "code": {"max_neighbors": 32, "ef_construction": 200, "ef_search": 128},
+    # tutorials are embedded one vector per file, a dozen or so: a graph over them saves nothing over a scan
+    "tutorial": None,
+    # a couple of hundred bounty rows: scanning them all costs less than walking a graph, and is exact
+    "bounty": None,
+}
+
+
+class PartitionedStore(VectorStore):
+    # code, tutorials and bounties in separate collections ({collection_name}_{type}) behind the VectorStore interface.
+    # Upserts are routed by metadata["type"]; a where filter on "type" picks the partitions to search and is dropped
+    # from the filter they see, so no partition runs a filtered search just to separate source types. Searches that
+    # span partitions run concurrently, one thread per partition
+    def __init__(self, kind: str, persist_directory: str, collection_name: str, create: bool = False):
+        if kind not in STORES: raise ValueError(f"unknown vector store {kind!r}, expected one of {', '.join(STORES)}")
+        self.parts: Dict[str, VectorStore] = {}
+        for source, hnsw in PARTITIONS.items():
+            name = f"{collection_name}_{source}"
+            if hnsw is None or kind == "flat": self.parts[source] = FlatStore(persist_directory, name, create)
+            else: self.parts[source] = ChromaStore(persist_directory, name, create, hnsw)
+        self.pool = ThreadPoolExecutor(max_workers=len(self.parts), thread_name_prefix="store-fan-out")
+
+    def _route(self, where: Optional[Dict]) -> Tuple[List[str], Optional[Dict]]:
+        # the partitions a filter can match, and what is left of the filter once its type condition is implied
+        if not where: return list(self.parts), None
+        clauses = where["$and"] if list(where) == ["$and"] else [{key: value} for key, value in where.items()]
+        sources, rest = set(self.parts), []
+        for clause in clauses:
+            if list(clause) != ["type"]:
+                rest.append(clause)
+                continue
+            op, value = next(iter(clause["type"].items())) if isinstance(clause["type"], dict) else ("$eq", clause["type"])
+            if op == "$eq": sources &= {value}
+            elif op == "$ne": sources -= {value}
+            elif op == "$in": sources &= set(value)
+            elif op == "$nin": sources -= set(value)
+            else: rest.append(clause)
+        return [source for source in self.parts if source in sources], None if not rest else rest[0] if len(rest) == 1 else {"$and": rest}
+
+    def count(self) -> int:
+        return sum(part.count() for part in self.parts.values())
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        rows: Dict[str, List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            source = metadata.get("type")
+            if source not in self.parts: raise ValueError(f"no collection for documents of type {source!r}, expected one of {', '.join(self.parts)}")
+            rows.setdefault(source, []).append(i)
+        for source, index in rows.items():
+            vectors = embeddings[index] if isinstance(embeddings, np.ndarray) else [embeddings[i] for i in index]
+            self.parts[source].upsert([ids[i] for i in index], vectors, [documents[i] for i in index], [metadatas[i] for i in index])
+
+    def delete(self, ids):
+        for part in self.parts.values(): part.delete(ids)
+
+    def get(self, where=None, limit=None, offset=0):
+        sources, where = self._route(where)
+        if len(sources) == 1: return self.parts[sources[0]].get(where, limit, offset)
+        hits: List[Hit] = []
+        for source in sources:
+            if limit is not None and len(hits) >= limit: break
+            part = self.parts[source]
+            if where is None:
+                # page through the partitions in order, skipping whole ones before the offset unread
+                size = part.count()
+                if offset >= size:
+                    offset -= size
+                    continue
+                hits += part.get(None, None if limit is None else limit - len(hits), offset)
+                offset = 0
+            else:
+                found = part.get(where, None if limit is None else offset + limit - len(hits))
+                hits += found[offset:]
+                offset = max(0, offset - len(found))
+        return hits
+
+    def query_groups(self, embedding, groups):
+        # one query_groups call per partition covering every group routed to it, all partitions at once
+        searches: Dict[str, List[Tuple[int, int, Optional[Dict]]]] = {}
+        for group, (n_results, where) in enumerate(groups):
+            sources, where = self._route(where)
+            for source in sources: searches.setdefault(source, []).append((group, n_results, where))
+
+        def search(source: str) -> List[List[Hit]]:
+            return self.parts[source].query_groups(embedding, [(n_results, where) for _, n_results, where in searches[source]])
+
+        if len(searches) == 1: found = {source: search(source) for source in searches}
+        else:
+            futures = {source: self.pool.submit(search, source) for source in searches}
+            found = {source: future.result() for source, future in futures.items()}
+        results: List[List[Hit]] = [[] for _ in groups]
+        for source, hits in found.items():
+            for (group, _, _), group_hits in zip(searches[source], hits): results[group] += group_hits
+        return [sorted(hits, key=lambda hit: hit["score"], reverse=True)[:n_results] for hits, (n_results, _) in zip(results, groups)]
+
+    def query(self, embedding, n_results, where=None):
+        return self.query_groups(embedding, [(n_results, where)])[0]
+
+    def export(self):
+        parts = [part.export() for part in self.parts.values()]
+        parts = [part for part in parts if part[0]]
+        if not parts: return [], np.zeros((0, 0), np.float32), [], []
+        return ([doc_id for part in parts for doc_id in part[0]], np.concatenate([part[1] for part in parts]),
+                [doc for part in parts for doc in part[2]], [metadata for part in parts for metadata in part[3]])
+
+    def reset(self):
+        for part in self.parts.values(): part.reset()
+
+    def drop(self):
+        for part in self.parts.values(): part.drop()
+
+    def flush(self):
+        for part in self.parts.values(): part.flush()
+
+    def refresh(self):
+        for part in self.parts.values(): part.refresh()
@@ -0,0 +1,94 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+STORES = ("chroma", "flat")
+Hit = Dict[str, Any]
+
+
+class VectorStore:
+    # what the indexer and retriever need from a vector store. Hits are {"id", "content", "metadata", "score"},
+    # where score is 1 - squared L2 distance (Chroma's default space), so both stores rank and score alike
+    def count(self) -> int: raise NotImplementedError
+    def upsert(self, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict[str, Any]]): raise NotImplementedError
+    def delete(self, ids: List[str]): raise NotImplementedError
+    def get(self, where: Optional[Dict] = None, limit: Optional[int] = None, offset: int = 0) -> List[Hit]: raise NotImplementedError
+    def query(self, embedding: Sequence[float], n_results: int, where: Optional[Dict] = None) -> List[Hit]: raise NotImplementedError
+    def reset(self): raise NotImplementedError
+    def drop(self): raise NotImplementedError  # remove the collection and its files entirely
+
+    def export(self) -> Tuple[List[str], np.ndarray, List[str], List[Dict[str, Any]]]:
+        # everything in the store: ids, float32 embeddings (one row per id), documents and metadata
+        raise NotImplementedError
+
+    def query_groups(self, embedding: Sequence[float], groups: List[Tuple[int, Optional[Dict]]]) -> List[List[Hit]]:
+        # several (n_results, where) searches for one query embedding
+        return [self.query(embedding, n_results, where) for n_results, where in groups]
+
+    def flush(self):
+        # make pending writes visible to readers; a no-op for stores that write through
+        pass
+
+    def refresh(self):
+        # pick up writes made by another process; a no-op for stores that read through
+        pass
+
+
+class ChromaStore(VectorStore):
+    # hnsw: chroma's HNSW settings (max_neighbors, ef_construction, ef_search) for a collection created here;
+    # an existing collection keeps the settings it was created with
+    def __init__(self, persist_directory: str, collection_name: str, create: bool = False, hnsw: Optional[Dict[str, int]] = None):
+        import chromadb
+        self.collection_name = collection_name
+        self.configuration = {"hnsw": hnsw} if hnsw else None
+        self.client = chromadb.PersistentClient(path=persist_directory)
+        self.collection = self.client.get_or_create_collection(collection_name, configuration=self.configuration) if create else self.client.get_collection(collection_name)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        # chroma rejects writes above its maximum batch size (5461 rows by default); bulk encodes on many cores exceed it
+        step = self.client.get_max_batch_size()
+        for offset in range(0, len(ids), step):
+            end = offset + step
+            self.collection.upsert(ids=ids[offset:end], embeddings=embeddings[offset:end], documents=documents[offset:end], metadatas=metadatas[offset:end])
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    def get(self, where=None, limit=None, offset=0):
+        results = self.collection.get(where=where, limit=limit, offset=offset or None, include=["metadatas", "documents"])
+        return [{"id": doc_id, "content": doc, "metadata": metadata, "score": 1.0}
+                for doc_id, doc, metadata in zip(results["ids"], results["documents"], results["metadatas"]) if doc is not None]
+
+    def query(self, embedding, n_results, where=None):
+        results = self.collection.query(query_embeddings=[list(embedding)], n_results=n_results, where=where, include=["metadatas", "documents", "distances"])
+        return [{"id": doc_id, "content": doc, "metadata": metadata, "score": 1.0 - distance}
+                for doc_id, doc, metadata, distance in zip(results["ids"][0], results["documents"][0], results["metadatas"][0], results["distances"][0]) if doc is not None]
+
+    def reset(self):
+        self.client.delete_collection(self.collection_name)
+        self.collection = self.client.create_collection(self.collection_name, configuration=self.configuration)
+
+    def drop(self):
+        self.client.delete_collection(self.collection_name)
+
+    def export(self):
+        ids, embeddings, documents, metadatas = [], [], [], []
+        for offset in range(0, self.count(), 1000):
+            batch = self.collection.get(limit=1000, offset=offset, include=["embeddings", "documents", "metadatas"])
+            ids += batch["ids"]; embeddings.append(np.asarray(batch["embeddings"], dtype=np.float32))
+            documents += batch["documents"]; metadatas += batch["metadatas"]
+        return ids, np.concatenate(embeddings) if embeddings else np.zeros((0, 0), np.float32), documents, metadatas
+
+
+def open_store(kind: str, persist_directory: str, collection_name: str, create: bool = False, partitioned: bool = False) -> VectorStore:
+    # partitioned: one collection per source type ({collection_name}_code, _tutorial, _bounty) behind one store
+    if partitioned:
+        from src.store.partitioned import PartitionedStore
+        return PartitionedStore(kind, persist_directory, collection_name, create)
+    if kind == "chroma": return ChromaStore(persist_directory, collection_name, create)
+    if kind == "flat":
+        from src.store.flat import FlatStore
+        return FlatStore(persist_directory, collection_name, create)
+    raise ValueError(f"unknown vector store {kind!r}, expected one of {', '.join(STORES)}")
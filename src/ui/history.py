@@ -0,0 +1,143 @@
+import queue
+import sqlite3
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+from src.rag.tracing import STAGES, COUNTERS
+
+
+class HistoryStore:
+    # chat history in chat_history.db: WAL mode, inserts batched by a background writer thread so the UI never waits
+    # on a commit, the last max_recent interactions kept in memory, and an FTS5 index over every query and answer
+    def __init__(self, db_path: str = "chat_history.db", max_recent: int = 100, batch_size: int = 256):
+        self.db_path = db_path
+        self.recent = deque(maxlen=max_recent)
+        self.batch_size = batch_size
+        self.conn = self._connect()
+        self.create_tables()
+        self.writes: queue.Queue = queue.Queue()
+        self.errors: List[BaseException] = []
+        self.writer = threading.Thread(target=self._writer, name="history-writer", daemon=True)
+        self.writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # with WAL, NORMAL only risks the last transactions on power loss, never corruption
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def create_tables(self):
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS interactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                query TEXT,
+                answer TEXT
+            )
+        """)
+        # per-stage timings (ms) and counters live next to each interaction; add any columns older databases lack
+        existing = {row[1] for row in cursor.execute("PRAGMA table_info(interactions)")}
+        for column, kind in [(f"{stage}_ms", "REAL") for stage in STAGES] + [(counter, "INTEGER") for counter in COUNTERS]:
+            if column not in existing: cursor.execute(f"ALTER TABLE interactions ADD COLUMN {column} {kind}")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS startup_times (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                time_to_prompt REAL,
+                time_to_first_answer REAL
+            )
+        """)
+        # external-content FTS5 index: the text lives once in interactions, triggers keep the index in step
+        has_fts = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'interactions_fts'").fetchone()
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS interactions_fts USING fts5(
+                query, answer, content='interactions', content_rowid='id', tokenize="unicode61 tokenchars '_'"
+            )
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS interactions_fts_insert AFTER INSERT ON interactions BEGIN
+                INSERT INTO interactions_fts(rowid, query, answer) VALUES (new.id, new.query, new.answer);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS interactions_fts_delete AFTER DELETE ON interactions BEGIN
+                INSERT INTO interactions_fts(interactions_fts, rowid, query, answer) VALUES ('delete', old.id, old.query, old.answer);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS interactions_fts_update AFTER UPDATE OF query, answer ON interactions BEGIN
+                INSERT INTO interactions_fts(interactions_fts, rowid, query, answer) VALUES ('delete', old.id, old.query, old.answer);
+                INSERT INTO interactions_fts(rowid, query, answer) VALUES (new.id, new.query, new.answer);
+            END
+        """)
+        if not has_fts: cursor.execute("INSERT INTO interactions_fts(interactions_fts) VALUES ('rebuild')")
+        self.conn.commit()
+
+    def log(self, query: str, answer: str, trace=None, cached: bool = False):
+        self.recent.append((query, answer, cached))
+        columns, values = ["query", "answer"], [query, answer]
+        if trace is not None:
+            for stage in STAGES:
+                if stage in trace.durations: columns.append(f"{stage}_ms"); values.append(trace.durations[stage] * 1000)
+            for counter in COUNTERS:
+                if counter in trace.counters: columns.append(counter); values.append(trace.counters[counter])
+        self.writes.put((f"INSERT INTO interactions ({', '.join(columns)}) VALUES ({', '.join('?' * len(values))})", values))
+
+    def write(self, statements: List[tuple]):
+        # (sql, values) statements from other tables in this database, committed in order by the same writer
+        for statement in statements: self.writes.put(statement)
+
+    def log_startup(self, time_to_prompt: Optional[float], time_to_first_answer: Optional[float]):
+        self.writes.put(("INSERT INTO startup_times (time_to_prompt, time_to_first_answer) VALUES (?, ?)", (time_to_prompt, time_to_first_answer)))
+
+    def _writer(self):
+        # one transaction per batch: whatever is already queued, up to batch_size statements. A lone write commits
+        # at once; under bursts the queue fills while the previous commit runs and batches grow on their own
+        conn = self._connect()
+        while True:
+            batch = [self.writes.get()]
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                try: batch.append(self.writes.get_nowait())
+                except queue.Empty: break
+            statements = [item for item in batch if item is not None]
+            try:
+                with conn:
+                    for sql, values in statements: conn.execute(sql, values)
+            except sqlite3.Error:
+                # the batch rolled back as a whole: replay it one statement per transaction so a bad write loses only itself
+                for sql, values in statements:
+                    try:
+                        with conn: conn.execute(sql, values)
+                    except sqlite3.Error as e: self.errors.append(e)
+            for _ in batch: self.writes.task_done()
+            if batch[-1] is None: break
+        conn.close()
+
+    def flush(self):
+        # block until everything logged so far is committed
+        self.writes.join()
+
+    def search(self, terms: str, limit: int = 5, candidates: int = 2000) -> List[Dict[str, Any]]:
+        # every word must match (quoted, so user input is never parsed as FTS5 syntax). Only the newest `candidates`
+        # matches are ranked by bm25: ranking every match of a common word costs time linear in the whole history,
+        # walking the index newest-first does not
+        match = " ".join('"' + word.replace('"', '""') + '"' for word in terms.split())
+        if not match: return []
+        self.flush()
+        scored = self.conn.execute("SELECT rowid, bm25(interactions_fts) FROM interactions_fts WHERE interactions_fts MATCH ? ORDER BY rowid DESC LIMIT ?", (match, candidates)).fetchall()
+        best = [rowid for rowid, _ in sorted(scored, key=lambda row: row[1])[:limit]]
+        if not best: return []
+        rows = self.conn.execute(f"""
+            SELECT i.id, i.timestamp, i.query, i.answer, snippet(interactions_fts, 1, char(2), char(3), '…', 48)
+            FROM interactions_fts JOIN interactions i ON i.id = interactions_fts.rowid
+            WHERE interactions_fts MATCH ? AND interactions_fts.rowid IN ({', '.join('?' * len(best))})
+        """, (match, *best)).fetchall()
+        order = {rowid: i for i, rowid in enumerate(best)}
+        return sorted(({"id": row[0], "timestamp": row[1], "query": row[2], "answer": row[3], "snippet": row[4]} for row in rows), key=lambda row: order[row["id"]])
+
+    def close(self):
+        self.writes.put(None)
+        self.writer.join()
+        self.conn.close()
@@ -1,46 +1,104 @@
 from rich.console import Console
 from rich.panel import Panel
 from rich.progress import Progress
+from rich.live import Live
+from rich.spinner import Spinner
+from rich.text import Text
+from rich.table import Table
+from rich.markup import escape
 from src.rag.retriever import Retriever
 from src.rag.generator import Generator
+from src.rag.answer_cache import AnswerCache
+from src.rag.prefetch import Prefetcher
+from src.rag.tracing import STAGES, COUNTERS, start_trace, span, record, count, set_counter, percentiles
+from src.ui.history import HistoryStore
 import sys
+import time
+import asyncio
 import termios
 import tty
 import os
-import sqlite3
 
 class ChatbotInterface:
-    def __init__(self, retriever=None, generator=None):
+    def __init__(self, retriever=None, generator=None, answer_cache=None, started_at=None, prefetch=True):
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.time_to_prompt = None
+        self.time_to_first_answer = None
         self.console = Console()
         try:
             self.retriever = retriever or Retriever()
             self.generator = generator or Generator(model_name="gpt-4o-mini-2024-07-18")
-            self.create_db()  
+            self.history_store = HistoryStore("chat_history.db")
+            self.answer_cache = answer_cache or AnswerCache("chat_history.db", write=self.history_store.write)
+            # retrieval runs speculatively during typing pauses, see Prefetcher
+            self.prefetcher = Prefetcher(self.retriever) if prefetch else None
         except Exception as e:
             self.console.print(f"[red]Error initializing RAG system: {str(e)}[/red]")
             sys.exit(1)
-        self.history = []
+        # bounded: the last interactions for 'regen' and the history view; everything else is in chat_history.db
+        self.history = self.history_store.recent
         self.current_input = ""
         self.clear_screen()
         self.display_welcome()
+        for component in (self.retriever, self.generator):
+            if hasattr(component, "warm_up"): component.warm_up()
+        self.time_to_prompt = time.perf_counter() - self.started_at
+        self.console.print(f"[dim]ready in {self.time_to_prompt:.2f}s, loading models in the background[/dim]")
 
-    def create_db(self):
-        self.db_conn = sqlite3.connect("chat_history.db")
-        cursor = self.db_conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS interactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                query TEXT,
-                answer TEXT
-            )
-        """)
-        self.db_conn.commit()
-
-    def db_logs(self, query: str, answer: str):
-        cursor = self.db_conn.cursor()
-        cursor.execute("INSERT INTO interactions (query, answer) VALUES (?, ?)", (query, answer))
-        self.db_conn.commit()
+    def db_logs(self, query: str, answer: str, trace=None, cached: bool = False):
+        # queued for the background writer, never blocks the prompt
+        self.history_store.log(query, answer, trace, cached)
+
+    def display_stats(self):
+        self.history_store.flush()
+        self.display_write_errors()
+        rows = self.history_store.conn.execute(f"SELECT {', '.join(f'{stage}_ms' for stage in STAGES)}, {', '.join(COUNTERS)} FROM interactions WHERE total_ms IS NOT NULL").fetchall()
+        if not rows:
+            self.console.print("[yellow]No timed interactions yet.[/yellow]")
+            return
+        table = Table(title=f"Per-stage latency over {len(rows)} queries (ms)")
+        for column in ("stage", "n", "p50", "p95", "p99", "mean"): table.add_column(column, justify="left" if column == "stage" else "right")
+        for i, stage in enumerate(STAGES):
+            samples = [row[i] for row in rows if row[i] is not None]
+            if not samples: continue
+            stats = percentiles(samples)
+            table.add_row(stage, str(len(samples)), *(f"{stats[key]:.1f}" for key in ("p50", "p95", "p99", "mean")))
+        self.console.print(table)
+        counters = {name: [row[len(STAGES) + i] for row in rows if row[len(STAGES) + i] is not None] for i, name in enumerate(COUNTERS)}
+        mean = lambda values: sum(values) / len(values) if values else 0.0
+        self.console.print(f"[dim]docs retrieved: {mean(counters['docs_retrieved']):.1f} avg, prompt tokens: {mean(counters['prompt_tokens']):.0f} avg, "
+                           f"completion tokens: {mean(counters['completion_tokens']):.0f} avg[/dim]")
+        self.console.print(f"[dim]cache hits: answer {sum(counters['answer_cache_hit'])}, retrieval {sum(counters['retrieval_cache_hit'])}, "
+                           f"embedding {sum(counters['embedding_cache_hit'])} of {len(rows)} queries[/dim]")
+        saved = [row[STAGES.index("prefetch_saved")] for row in rows if row[STAGES.index("prefetch_saved")] is not None]
+        self.console.print(f"[dim]prefetch hits: {sum(counters['prefetch_hit'])} of {len(rows)} queries, {sum(saved):.0f}ms of retrieval saved ({mean(saved):.1f}ms per hit)[/dim]")
+        if self.prefetcher is not None:
+            stats = self.prefetcher.stats
+            self.console.print(f"[dim]this session: {stats['hits']} of {stats['submitted']} questions prefetched ({self.prefetcher.hit_rate():.0%}), "
+                               f"{stats['saved_seconds'] * 1000:.0f}ms saved, {stats['started']} prefetches started, {stats['stale']} discarded as stale[/dim]")
+
+    def display_write_errors(self):
+        # writes run on a background thread; failures would otherwise go unnoticed
+        errors = self.history_store.errors
+        if errors: self.console.print(f"[red]{len(errors)} chat history writes failed, last: {errors[-1]}[/red]")
+
+    def log_startup(self):
+        self.history_store.log_startup(self.time_to_prompt, self.time_to_first_answer)
+
+    def display_search(self, terms: str):
+        # answered from the FTS5 index alone: no retrieval, no LLM call
+        start = time.perf_counter()
+        matches = self.history_store.search(terms)
+        elapsed = time.perf_counter() - start
+        if not matches:
+            self.console.print(f"[yellow]No earlier answers match '{escape(terms)}'.[/yellow]")
+            return
+        for match in matches:
+            snippet = escape(match["snippet"]).replace("\x02", "[bold yellow]").replace("\x03", "[/bold yellow]")
+            self.console.print(f"[dim]#{match['id']} {match['timestamp']}[/dim]")
+            self.console.print(f"[bold cyan]You:[/bold cyan] {escape(match['query'])}")
+            self.console.print(f"[bold green]tinypilot:[/bold green] {snippet}\n")
+        self.console.print(f"[dim]{len(matches)} matches in {elapsed * 1000:.1f}ms[/dim]")
 
     def display_welcome(self):
         welcome_message = """
@@ -53,18 +111,28 @@ class ChatbotInterface:
         - How does the backward pass work?
         
         Commands:
+        - 'regen' to regenerate the last answer instead of using the cache
+        - 'history <terms>' to search earlier questions and answers ('history' alone shows the latest)
+        - 'stats' to show latency percentiles per stage
         - 'clear' to clear history
         - 'exit' to quit
         """
         self.console.print(Panel(welcome_message, title="Welcome", border_style="green"))
 
     def display_history(self):
-        for q, r in self.history[-10:]:
+        for q, r, cached in list(self.history)[-10:]:
             self.console.print(f"[bold cyan]You:[/bold cyan] {q}")
+            if cached: self.console.print("[dim](cached answer, type 'regen' to regenerate)[/dim]")
             self.console.print(f"[bold green]tinypilot:[/bold green] {r}\n")
 
+    def typed(self):
+        # hand every keystroke to the prefetcher; 'history' searches never touch the retriever
+        if self.prefetcher is None: return
+        self.prefetcher.update("" if self.current_input.lower().startswith("history") else self.current_input)
+
     def get_input(self):
         self.current_input = ""
+        self.typed()
         self.console.print("> ", end="", style="bold")
         
         old_settings = termios.tcgetattr(sys.stdin)
@@ -81,11 +149,13 @@ class ChatbotInterface:
                         self.current_input = self.current_input[:-1]
                         sys.stdout.write('\b \b')
                         sys.stdout.flush()
+                        self.typed()
                 
                 elif char.isprintable():
                     self.current_input += char
                     sys.stdout.write(char)
                     sys.stdout.flush()
+                    self.typed()
                 
                 elif char == '\x03': 
                     raise KeyboardInterrupt
@@ -97,43 +167,101 @@ class ChatbotInterface:
         os.system('cls' if os.name == 'nt' else 'clear')
 
     def clear_history(self):
-        self.history = []
+        self.history.clear()
         self.clear_screen()
         self.display_welcome()
         self.console.print("[yellow]History cleared[/yellow]")
 
+    async def stream_answer(self, query: str, docs):
+        # only the current answer is redrawn while tokens arrive; everything above it stays on screen
+        response, start, first_token = "", time.perf_counter(), None
+        with Live(Spinner("dots", text="Generating answer..."), console=self.console, refresh_per_second=15, vertical_overflow="visible") as live:
+            async for token in self.generator.stream_async(query, docs):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                    record("first_token", first_token)
+                response += token
+                with span("render"): live.update(Text.assemble(("tinypilot: ", "bold green"), response))
+        with span("render"): self.console.print()
+        return response, first_token
+
+    def answer(self, query: str, force: bool = False):
+        # retrieval done while the question was typed, if it still answers it
+        prefetched = self.prefetcher.take(query) if self.prefetcher is not None and not force else None
+        with Progress(transient=True) as progress:
+            progress.add_task("[cyan]Processing query...", total=None)
+            # symbol-only and pure bounty filter questions are answered without the embedding model; the answer
+            # cache then matches them by normalized text
+            if prefetched: embedding = prefetched["embedding"]
+            else: embedding = self.retriever.embed(query) if self.retriever.needs_embedding(query) else None
+            index_version = self.retriever.check_index_version()
+            with span("answer_cache"): hit = None if force else self.answer_cache.lookup(query, embedding, index_version)
+            if not hit and prefetched:
+                docs = prefetched["docs"]
+                count("prefetch_hit")
+                record("prefetch_saved", prefetched["saved"])
+                set_counter("docs_retrieved", len(docs))
+            elif not hit: docs = self.retriever.retrieve(query, query_embedding=embedding)
+        if hit:
+            count("answer_cache_hit")
+            with span("render"):
+                self.console.print("[dim](cached answer, type 'regen' to regenerate)[/dim]")
+                self.console.print(Text.assemble(("tinypilot: ", "bold green"), hit["answer"], "\n"))
+            return hit["answer"], True
+
+        response, first_token = asyncio.run(self.stream_answer(query, docs))
+        self.answer_cache.store(query, embedding, response, index_version)
+        usage = getattr(self.generator, "last_usage", None)
+        if usage and first_token is not None:
+            note = f", retrieval prefetched while typing ({prefetched['saved'] * 1000:.0f}ms saved)" if prefetched else ""
+            self.console.print(f"[dim]prompt: {usage['prompt_tokens']} tokens ({usage['context_tokens']} context), first token after {first_token:.2f}s{note}[/dim]")
+        return response, False
+
     def run(self):
         while True:
             query = self.get_input().strip()
+            force = False
             
             if query.lower() == "exit":
                 self.console.print("[bold yellow]Goodbye![/bold yellow]")
-                if hasattr(self, 'db_conn') and self.db_conn:
-                    self.db_conn.close()
+                if self.time_to_first_answer is None: self.log_startup()
+                if self.prefetcher is not None: self.prefetcher.close()
+                self.history_store.close()
+                self.display_write_errors()
+                self.answer_cache.close()
                 break
             elif query.lower() == "clear":
                 self.clear_history()
                 continue
+            elif query.lower() == "history" or query.lower().startswith("history "):
+                terms = query[len("history"):].strip()
+                if terms: self.display_search(terms)
+                else: self.display_history()
+                continue
+            elif query.lower() == "stats":
+                self.display_stats()
+                continue
+            elif query.lower() == "regen":
+                if not self.history:
+                    self.console.print("[red]Nothing to regenerate yet.[/red]")
+                    continue
+                query, force = self.history[-1][0], True
 
             if not query:
                 self.console.print("[red]Please enter a valid question or command.[/red]")
                 continue
 
+            trace = start_trace()
             try:
-                with Progress(transient=True) as progress:
-                    task = progress.add_task("[cyan]Processing query...", total=None)
-                    
-                    docs = self.retriever.retrieve(query)
-                    response = self.generator.generate(query, docs)
-                    self.history.append((query, response))
-                    self.db_logs(query, response)
-                    
-                    self.clear_screen()
-                    self.display_welcome()
-                    self.display_history()
+                if force: self.console.print(f"[bold cyan]You:[/bold cyan] {query}")
+                with span("total"): response, cached = self.answer(query, force)
+                self.db_logs(query, response, trace, cached)
+                if self.time_to_first_answer is None:
+                    self.time_to_first_answer = time.perf_counter() - self.started_at
+                    self.console.print(f"[dim]first answer {self.time_to_first_answer:.2f}s after start[/dim]")
+                    self.log_startup()
                     
             except Exception as e:
                 error_msg = f"[red]Error processing query: {str(e)}[/red]"
-                self.history.append((query, error_msg))
                 self.db_logs(query, error_msg)
                 self.console.print(f"[red]An error occurred. Please try again.[/red]") 
\ No newline at end of file
@@ -1,15 +1,36 @@
+import time
+STARTED_AT = time.perf_counter()
+
 from src.rag.retriever import Retriever
 from src.rag.generator import Generator
 from src.ui.interface import ChatbotInterface
 import os
 import sys
+import argparse
+
+MODEL_NAME = "all-MiniLM-L6-v2"
 
 def check_openai_api_key():
     if not os.getenv("OPENAI_API_KEY"):
         return False
     return True
 
+def load_snapshot(path):
+    # a snapshot is only loaded when the index on disk is not already the same commit, model and data
+    from src.indexing.snapshot import read_info, is_current, import_snapshot
+    info = read_info(path)
+    if is_current(info):
+        print(f"Index already matches snapshot (commit {(info['commit'] or 'unknown')[:12]}).")
+        return
+    print(f"Loading index snapshot {path} ({info['count']} docs, commit {(info['commit'] or 'unknown')[:12]})...")
+    result = import_snapshot(path, expected_model=MODEL_NAME)
+    print(f"Loaded in {result['seconds']:.2f}s.")
+
 def main():
+    parser = argparse.ArgumentParser(description="TinyPilot chat interface")
+    parser.add_argument("--snapshot", default=None, help="start from an index snapshot (see snapshot.py) instead of running main.py")
+    parser.add_argument("--no-prefetch", action="store_true", help="do not retrieve speculatively while a question is being typed")
+    args = parser.parse_args()
     print("Starting TinyPilot interface...")
     
     if not check_openai_api_key():
@@ -19,18 +40,20 @@ def main():
         sys.exit(1)
     
     try:
+        if args.snapshot: load_snapshot(args.snapshot)
         # Initialize RAG components with existing data
-        retriever = Retriever()
+        retriever = Retriever(model_name=MODEL_NAME)
         generator = Generator(model_name="gpt-4o-mini-2024-07-18")
         
         # Create and run interface
-        chatbot = ChatbotInterface(retriever=retriever, generator=generator)
+        chatbot = ChatbotInterface(retriever=retriever, generator=generator, started_at=STARTED_AT, prefetch=not args.no_prefetch)
         chatbot.run()
         
     except Exception as e:
         print(f"Error: {str(e)}")
         print("\nIf you haven't run the full initialization yet, please run:")
         print("python main.py")
+        print("or start from an index snapshot with: python tinypilot.py --snapshot <file>")
         sys.exit(1)
 
 if __name__ == "__main__":